@@ -0,0 +1,238 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark end-to-end de o4n_flash_dir, o4n_flash_copy y o4n_flash_chgldr contra N dispositivos simulados.
+
+Reporta por operacion: ops/s, latencia p50/p99 y bytes/s. Con --compare falla (exit 1) si ops/s o bytes/s
+caen mas que --tolerance respecto de un resultado previo guardado con --json.
+
+Uso:
+  python benchmarks/o4n_flash_bench.py --devices 8 --iterations 5 --latency 0.01 --file-size 4194304
+  python benchmarks/o4n_flash_bench.py --devices 8 --json bench_output.json
+  python benchmarks/o4n_flash_bench.py --devices 8 --compare bench_output.json --tolerance 0.2
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import o4n_flash_sim  # noqa: E402
+
+
+# Global variables
+COLLECTION = "ansible_collections.octupus.o4n_flash_mgmt"
+PLATAFORMA = "cisco_ios"
+FSYSTEM = "flash:"
+IMAGE = "c2900-universalk9-mz.SPA.155-3.M2.bin"
+
+
+# Importa un modulo de la coleccion desde el working tree
+def load_module(_name):
+    try:
+        return importlib.import_module("{}.plugins.modules.{}".format(COLLECTION, _name))
+    except ImportError:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        base = os.path.join(tempfile.gettempdir(), "o4n_flash_bench_collections")
+        link = os.path.join(base, "ansible_collections", "octupus", "o4n_flash_mgmt")
+        if not os.path.exists(link):
+            os.makedirs(os.path.dirname(link), exist_ok=True)
+            os.symlink(root, link)
+        sys.path.insert(0, base)
+        for module_name in [m for m in sys.modules if m.startswith("ansible_collections")]:
+            del sys.modules[module_name]
+        return importlib.import_module("{}.plugins.modules.{}".format(COLLECTION, _name))
+
+
+# Percentil sobre una lista ordenada
+def percentile(_values, _pct):
+    if not _values:
+        return 0.0
+    values = sorted(_values)
+    index = min(len(values) - 1, max(0, int(round(_pct / 100.0 * (len(values) - 1)))))
+    return values[index]
+
+
+# Resumen de una fase del benchmark
+def summarize(_name, _samples, _wall, _bytes):
+    latencies = [sample["latency"] for sample in _samples if sample["success"]]
+    return {
+        "operation": _name,
+        "ops": len(_samples),
+        "failed": len([sample for sample in _samples if not sample["success"]]),
+        "ops_per_s": round(len(latencies) / _wall, 3) if _wall else 0.0,
+        "p50_s": round(percentile(latencies, 50), 4),
+        "p99_s": round(percentile(latencies, 99), 4),
+        "bytes": _bytes,
+        "bytes_per_s": round(_bytes / _wall, 1) if _wall else 0.0,
+        "wall_s": round(_wall, 3),
+    }
+
+
+# Operacion dir (o4n_flash_dir)
+def op_dir(_mods, _host, _args):
+    mod = _mods["o4n_flash_dir"]
+    device, ret_msg, success = mod.connectToDevice(PLATAFORMA, _host, _args.user, _args.password,
+                                                   _args.ssh_config, _args.secret, _args.delay_factor)
+    if not success:
+        return False, 0, ret_msg
+    output, ret_msg, success = mod.outputFlash(device, "dir", _host, IMAGE, FSYSTEM, _args.read_mode)
+    device.disconnect()
+    return success and output["Search"]["found"], 0, ret_msg
+
+
+# Operacion copy put (o4n_flash_copy)
+def op_copy(_mods, _host, _args):
+    mod = _mods["o4n_flash_copy"]
+    device, ret_msg, success = mod.connectToDevice(PLATAFORMA, _host, _args.user, _args.password,
+                                                   _args.ssh_config, _args.secret, _args.delay_factor)
+    if not success:
+        return False, 0, ret_msg
+    output, success, ret_msg = mod.transfer(device, os.path.basename(_args.local_file),
+                                            os.path.basename(_args.local_file), FSYSTEM, "put",
+                                            os.path.dirname(_args.local_file), "no", False, True, _args.read_mode)
+    device.disconnect()
+    sent = _args.file_size if success and output.get("file_transferred") else 0
+    return success, sent, ret_msg
+
+
+# Operacion chgldr (o4n_flash_chgldr)
+def op_chgldr(_mods, _host, _args):
+    mod = _mods["o4n_flash_chgldr"]
+    device, ret_msg, success = mod.connectToDevice(PLATAFORMA, _host, _args.user, _args.password,
+                                                   _args.ssh_config, _args.secret, _args.delay_factor)
+    if not success:
+        return False, 0, ret_msg
+    salida_json, ret_msg, success = mod.outputFlash(device, "dir", _host, IMAGE, FSYSTEM, _args.read_mode)
+    if success and salida_json["Search"]["found"]:
+        ret_msg, success, output = mod.chgLoader(device, IMAGE, PLATAFORMA, "boot system " + FSYSTEM,
+                                                 _args.read_mode)
+    device.disconnect()
+    return success, 0, ret_msg
+
+
+# Ejecuta una fase contra todos los hosts
+def run_phase(_name, _operation, _mods, _hosts, _servers, _args):
+    jobs = [host for _ in range(_args.iterations) for host in _hosts]
+    samples = []
+    transferred = [0]
+
+    def worker(_host):
+        if _name == "copy":
+            # fuerza la transferencia en cada iteracion
+            server = _servers[_hosts.index(_host)]
+            with server.device.lock:
+                server.device.files.pop(os.path.basename(_args.local_file), None)
+        start = time.perf_counter()
+        try:
+            success, sent, ret_msg = _operation(_mods, _host, _args)
+        except Exception as error:
+            success, sent, ret_msg = False, 0, str(error)
+        latency = time.perf_counter() - start
+        transferred[0] += sent
+        samples.append({"host": _host, "success": success, "latency": latency, "msg": ret_msg})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=_args.workers or len(_hosts)) as pool:
+        list(pool.map(worker, jobs))
+    wall = time.perf_counter() - start
+    return summarize(_name, samples, wall, transferred[0]), samples
+
+
+# Compara contra un resultado previo
+def compare(_results, _baseline_file, _tolerance):
+    with open(_baseline_file) as baseline_fd:
+        baseline = {item["operation"]: item for item in json.load(baseline_fd)["results"]}
+    regressions = []
+    for result in _results:
+        previous = baseline.get(result["operation"])
+        if not previous:
+            continue
+        for metric in ["ops_per_s", "bytes_per_s"]:
+            if previous[metric] and result[metric] < previous[metric] * (1 - _tolerance):
+                regressions.append("{} {}: {} < {} (-{:.0%})".format(
+                    result["operation"], metric, result[metric], previous[metric],
+                    1 - result[metric] / previous[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="o4n_flash end-to-end benchmark")
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=0, help="concurrencia (default: un worker por device)")
+    parser.add_argument("--operations", default="dir,copy,chgldr")
+    parser.add_argument("--latency", type=float, default=0.005, help="segundos por comando en el simulador")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/s SCP por device (0 = sin limite)")
+    parser.add_argument("--file-size", type=int, default=1048576, help="bytes del file transferido en copy")
+    parser.add_argument("--delay-factor", type=float, default=.1)
+    parser.add_argument("--read-mode", default="delay", choices=["delay", "pattern"])
+    parser.add_argument("--secret", default="enable")
+    parser.add_argument("--json", default="", help="guarda resultados en este file")
+    parser.add_argument("--compare", default="", help="resultado previo contra el cual comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.read_mode == "pattern":
+        args.delay_factor = 1.0
+    args.user = "admin"
+    args.password = "admin"
+
+    workdir = tempfile.mkdtemp(prefix="o4n_flash_bench_")
+    args.ssh_config = os.path.join(workdir, "ssh_config")
+    args.local_file = os.path.join(workdir, "o4n_bench_image.bin")
+    with open(args.local_file, "wb") as local_fd:
+        local_fd.write(os.urandom(args.file_size))
+
+    servers = o4n_flash_sim.start_devices(
+        args.devices, files_spec={IMAGE: 1048576, "vlan.dat": 676}, user=args.user, password=args.password,
+        secret=args.secret, latency=args.latency, bandwidth=args.bandwidth)
+    hosts = o4n_flash_sim.write_ssh_config(servers, args.ssh_config)
+    mods = {name: load_module(name) for name in ["o4n_flash_dir", "o4n_flash_copy", "o4n_flash_chgldr"]}
+    operations = {"dir": op_dir, "copy": op_copy, "chgldr": op_chgldr}
+
+    results = []
+    try:
+        for name in filter(None, args.operations.split(",")):
+            summary, samples = run_phase(name, operations[name], mods, hosts, servers, args)
+            results.append(summary)
+            failures = [sample["msg"] for sample in samples if not sample["success"]]
+            if failures:
+                print("{}: {} failed, first error: {}".format(name, len(failures), failures[0]))
+    finally:
+        for server in servers:
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("{:<8} {:>6} {:>6} {:>10} {:>9} {:>9} {:>14}".format(
+        "op", "ops", "fail", "ops/s", "p50(s)", "p99(s)", "bytes/s"))
+    for result in results:
+        print("{operation:<8} {ops:>6} {failed:>6} {ops_per_s:>10} {p50_s:>9} {p99_s:>9} {bytes_per_s:>14}".format(
+            **result))
+
+    report = {"devices": args.devices, "iterations": args.iterations, "latency": args.latency,
+              "read_mode": args.read_mode,
+              "bandwidth": args.bandwidth, "file_size": args.file_size, "results": results}
+    if args.json:
+        with open(args.json, "w") as json_fd:
+            json.dump(report, json_fd, indent=2)
+
+    status = 1 if any(result["failed"] for result in results) else 0
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        status = 1 if regressions else status
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Regresion de performance determinista sobre sesiones grabadas (sin ruido de red).
+
+Mide el CPU time por operacion de outputFlash, tranfer_logic y chgLoader sirviendo transcripciones grabadas
+con ReplayConnection, y falla (exit 1) si alguna supera el budget configurado.
+
+Grabar fixtures desde dispositivos reales: exportar O4N_FLASH_RECORD=<dir> y correr el playbook.
+Grabar fixtures desde el simulador local:
+  python benchmarks/o4n_flash_replay_bench.py --record-sim benchmarks/fixtures
+Correr la regresion:
+  python benchmarks/o4n_flash_replay_bench.py --fixtures benchmarks/fixtures --budget benchmarks/replay_budget.json
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import o4n_flash_bench  # noqa: E402
+
+# Global variables
+NOT_FOUND = "o4n-replay-not-found.bin"
+TRANSFER_METHODS = ["verify_space_available", "check_file_exists", "compare_md5", "transfer_file", "get_file"]
+
+
+# Sub-fixture con un subconjunto de llamadas
+def sub_fixture(_fixture, _calls):
+    return {"version": _fixture["version"], "host": _fixture["host"], "attrs": _fixture.get("attrs", {}),
+            "calls": _calls}
+
+
+# Escenarios outputFlash: cada "dir <fs>" grabado
+def scenarios_output_flash(_fixture, _mods, _connection):
+    mod = _mods["o4n_flash_dir"]
+    for call in _fixture["calls"]:
+        if call["label"] == "device" and call["method"] == "send_command" and \
+                str(call["args"][0]).startswith("dir ") and "/" not in str(call["args"][0]):
+            fixture = sub_fixture(_fixture, [call])
+            flash = call["args"][0].split(" ", 1)[1]
+            yield lambda fixture=fixture, flash=flash: mod.outputFlash(
+                _connection(fixture), "dir", _fixture["host"], NOT_FOUND, flash)
+
+
+# Escenarios chgLoader: send_config_set "boot system" + save_config
+def scenarios_chg_loader(_fixture, _mods, _connection):
+    mod = _mods["o4n_flash_chgldr"]
+    calls = [call for call in _fixture["calls"] if call["label"] == "device"]
+    for index, call in enumerate(calls):
+        if call["method"] != "send_config_set" or not isinstance(call["args"][0], list):
+            continue
+        match = re.match(r"^(boot system \S*?:/?)(\S+)$", call["args"][0][-1])
+        if not match or index + 1 >= len(calls) or calls[index + 1]["method"] != "save_config":
+            continue
+        fixture = sub_fixture(_fixture, [call, calls[index + 1]])
+        plataforma = _fixture.get("attrs", {}).get("device", {}).get("device_type", "cisco_ios")
+        yield lambda fixture=fixture, match=match, plataforma=plataforma: mod.chgLoader(
+            _connection(fixture), match.group(2), plataforma, match.group(1))
+
+
+# Escenarios tranfer_logic: secuencia de llamadas sobre FileTransfer
+def scenarios_transfer_logic(_fixture, _mods, _connection):
+    mod = _mods["o4n_flash_copy"]
+    calls = [call for call in _fixture["calls"] if call["label"] == "transfer" and
+             call["method"] in TRANSFER_METHODS]
+    if calls:
+        fixture = sub_fixture(_fixture, calls)
+        operation = "get" if "get_file" in [call["method"] for call in calls] else "put"
+        yield lambda: mod.tranfer_logic(_connection(fixture, "transfer"), operation, False, "no",
+                                        "file", "no", "file", "flash:", "/", "file", "/", "file")
+
+
+# Mide CPU time por operacion
+def measure(_scenario, _iterations):
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(_iterations):
+        _scenario()
+    return (time.process_time() - cpu_start) / _iterations, (time.perf_counter() - wall_start) / _iterations
+
+
+# Graba fixtures corriendo los modulos contra el simulador
+def record_sim(_directory):
+    import o4n_flash_sim
+    os.environ["O4N_FLASH_RECORD"] = os.path.abspath(_directory)
+    workdir = tempfile.mkdtemp(prefix="o4n_flash_record_")
+    args = argparse.Namespace(user="admin", password="admin", secret="enable", delay_factor=.1, read_mode="delay",
+                              ssh_config=os.path.join(workdir, "ssh_config"),
+                              local_file=os.path.join(workdir, "o4n_replay_image.bin"), file_size=262144)
+    with open(args.local_file, "wb") as local_fd:
+        local_fd.write(os.urandom(args.file_size))
+    files = {o4n_flash_bench.IMAGE: 1048576, "vlan.dat": 676}
+    files.update({"crashinfo_{:03d}".format(index): 4096 + index for index in range(40)})
+    servers = o4n_flash_sim.start_devices(1, files_spec=files, user=args.user, password=args.password,
+                                          secret=args.secret)
+    hosts = o4n_flash_sim.write_ssh_config(servers, args.ssh_config)
+    mods = {name: o4n_flash_bench.load_module(name) for name in ["o4n_flash_dir", "o4n_flash_copy",
+                                                                 "o4n_flash_chgldr"]}
+    try:
+        for operation in [o4n_flash_bench.op_dir, o4n_flash_bench.op_copy, o4n_flash_bench.op_copy,
+                          o4n_flash_bench.op_chgldr]:
+            print(operation.__name__, operation(mods, hosts[0], args))
+    finally:
+        for server in servers:
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="o4n_flash replay CPU regression runner")
+    parser.add_argument("--fixtures", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures"))
+    parser.add_argument("--budget", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         "replay_budget.json"))
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--timing", action="store_true", help="replay con el timing grabado")
+    parser.add_argument("--record-sim", default="", help="graba fixtures desde el simulador en este directorio")
+    args = parser.parse_args()
+
+    if args.record_sim:
+        record_sim(args.record_sim)
+        return
+
+    mods = {name: o4n_flash_bench.load_module(name) for name in ["o4n_flash_dir", "o4n_flash_copy",
+                                                                 "o4n_flash_chgldr"]}
+    from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils import o4n_flash_replay as replay
+
+    def connection(_fixture, _label="device"):
+        return replay.ReplayConnection(_fixture, _label, args.timing)
+
+    with open(args.budget) as budget_fd:
+        budget = json.load(budget_fd)
+    iterations = 1 if args.timing else args.iterations
+
+    scenarios = {"outputFlash": scenarios_output_flash, "tranfer_logic": scenarios_transfer_logic,
+                 "chgLoader": scenarios_chg_loader}
+    results = {name: [] for name in scenarios}
+    for fixture_file in sorted(glob.glob(os.path.join(args.fixtures, "*.json"))):
+        fixture = replay.load_fixture(fixture_file)
+        for name, builder in scenarios.items():
+            for scenario in builder(fixture, mods, connection):
+                results[name].append(measure(scenario, iterations))
+
+    failed = False
+    print("{:<14} {:>6} {:>12} {:>12} {:>12}".format("operation", "runs", "cpu_us/op", "wall_us/op", "budget_us"))
+    for name, samples in results.items():
+        if not samples:
+            continue
+        cpu_us = max(sample[0] for sample in samples) * 1e6
+        wall_us = max(sample[1] for sample in samples) * 1e6
+        limit = budget.get(name, {}).get("cpu_us")
+        over = limit is not None and not args.timing and cpu_us > limit
+        failed = failed or over
+        print("{:<14} {:>6} {:>12.1f} {:>12.1f} {:>12} {}".format(
+            name, len(samples), cpu_us, wall_us, limit if limit is not None else "-", "OVER BUDGET" if over else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de throughput de los transportes de o4n_flash_copy (xfer_mode) contra el simulador, a distintos RTT.
+
+Por cada RTT levanta un dispositivo simulado detras de un relay con ese RTT y mide put y get con:
+  - scp: FileTransfer SCP de netmiko con ventanas y buffers default
+  - scp-tuned: SCP con window_size / block_size
+  - sftp: SFTP pipelined con window_size / block_size
+  - pull: copy http:// ejecutado en el dispositivo contra un file server local (pull_serve, solo put)
+
+--device-window fija la ventana SSH que anuncia el dispositivo: con la ventana chica de un IOS real, el put por
+SCP y por SFTP queda acotado por ella y solo pull la evita.
+
+Uso:
+  python benchmarks/o4n_flash_xfer_bench.py --rtts 0,0.05,0.2 --file-size 8388608
+  python benchmarks/o4n_flash_xfer_bench.py --rtts 0.1 --device-window 65536 --json xfer_output.json
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import o4n_flash_sim  # noqa: E402
+from o4n_flash_bench import load_module, PLATAFORMA, FSYSTEM  # noqa: E402
+
+
+# Global variables
+XFER_FILE = "o4n_xfer_bench.bin"
+TRANSPORTS = ["scp", "scp-tuned", "sftp", "pull"]
+
+
+# Puerto TCP libre para el file server de pull
+def free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+# Parametros xfer del modulo para cada transporte
+def xfer_options(_transport, _args):
+    if _transport == "scp":
+        return {"mode": "scp"}
+    if _transport == "scp-tuned":
+        return {"mode": "scp", "window_size": _args.window_size, "block_size": _args.block_size}
+    if _transport == "sftp":
+        return {"mode": "sftp", "window_size": _args.window_size, "block_size": _args.block_size}
+    return {"mode": "pull", "pull_url": "http://127.0.0.1:{}".format(free_port()), "pull_serve": True}
+
+
+# Una transferencia. Se mide solo transfer() (sin el login SSH). Retorna (success, segundos, ret_msg)
+def run_transfer(_mod, _server, _host, _transport, _operation, _args):
+    if _operation == "put":
+        with _server.device.lock:
+            _server.device.files.pop(XFER_FILE, None)
+        lpath, dpath = _args.workdir, "no"
+    else:
+        local = os.path.join(_args.getdir, XFER_FILE)
+        if os.path.exists(local):
+            os.unlink(local)
+        lpath, dpath = "no", _args.getdir
+    device, ret_msg, success = _mod.connectToDevice(PLATAFORMA, _host, _args.user, _args.password,
+                                                    _args.ssh_config, _args.secret, 1.0)
+    if not success:
+        return False, 0.0, ret_msg
+    start = time.perf_counter()
+    output, success, ret_msg = _mod.transfer(device, XFER_FILE, XFER_FILE, FSYSTEM, _operation, lpath, dpath,
+                                             True, True, "pattern", None, None, xfer_options(_transport, _args))
+    elapsed = time.perf_counter() - start
+    device.disconnect()
+    return success and output.get("file_transferred", False), elapsed, ret_msg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="o4n_flash_copy transport throughput benchmark")
+    parser.add_argument("--rtts", default="0,0.05,0.2", help="RTTs emulados en segundos, separados por coma")
+    parser.add_argument("--transports", default=",".join(TRANSPORTS))
+    parser.add_argument("--operations", default="put,get")
+    parser.add_argument("--iterations", type=int, default=2)
+    parser.add_argument("--file-size", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/s del dispositivo (0 = sin limite)")
+    parser.add_argument("--device-window", type=int, default=0, help="ventana SSH del dispositivo (0 = paramiko)")
+    parser.add_argument("--window-size", type=int, default=16 * 1024 * 1024)
+    parser.add_argument("--block-size", type=int, default=32768)
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--json", default="", help="guarda el resultado")
+    args = parser.parse_args()
+
+    mod = load_module("o4n_flash_copy")
+    args.workdir = tempfile.mkdtemp(prefix="o4n_xfer_bench_")
+    args.getdir = os.path.join(args.workdir, "get")
+    os.makedirs(args.getdir)
+    payload = o4n_flash_sim.build_files({XFER_FILE: args.file_size})
+    with open(os.path.join(args.workdir, XFER_FILE), "wb") as image:
+        image.write(payload[XFER_FILE])
+
+    results = []
+    try:
+        for rtt in [float(value) for value in args.rtts.split(",")]:
+            servers = o4n_flash_sim.start_devices(1, files_spec={XFER_FILE: args.file_size}, user=args.user,
+                                                  password=args.password, secret=args.secret, rtt=rtt,
+                                                  window=args.device_window, bandwidth=args.bandwidth)
+            args.ssh_config = os.path.join(args.workdir, "ssh_config")
+            host = o4n_flash_sim.write_ssh_config(servers, args.ssh_config)[0]
+            for operation in args.operations.split(","):
+                for transport in args.transports.split(","):
+                    if transport == "pull" and operation != "put":
+                        continue
+                    timings = []
+                    error = ""
+                    for _ in range(args.iterations):
+                        success, elapsed, ret_msg = run_transfer(mod, servers[0], host, transport, operation, args)
+                        if success:
+                            timings.append(elapsed)
+                        else:
+                            error = ret_msg
+                    best = min(timings) if timings else 0.0
+                    results.append({
+                        "rtt_s": rtt, "operation": operation, "transport": transport,
+                        "ok": len(timings), "failed": args.iterations - len(timings),
+                        "best_s": round(best, 3),
+                        "bytes_per_s": round(args.file_size / best, 1) if best else 0.0,
+                        "error": error,
+                    })
+                    print("rtt={:<6} {:<4} {:<10} {:>9.3f}s {:>14.1f} B/s  {}".format(
+                        rtt, operation, transport, best, results[-1]["bytes_per_s"], error))
+            for server in servers:
+                server.stop()
+    finally:
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"file_size": args.file_size, "device_window": args.device_window, "results": results},
+                      output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Transporte multiplexado via bastion (bastion_mode: mux).
+#
+# Con un ssh_config que usa ProxyJump, netmiko abre una conexion nueva al bastion por cada dispositivo. En modo
+# mux se mantiene una unica conexion autenticada al bastion por controller (OpenSSH ControlMaster persistente,
+# compartido por todos los forks y ejecuciones) y cada dispositivo se alcanza por un canal -W sobre ella.
+# La cantidad de canales simultaneos por bastion se limita con un semaforo entre procesos (mux_channels),
+# alineado con el MaxSessions del sshd del bastion. Cada conexion SSH al dispositivo es un canal: o4n_flash_copy
+# abre una segunda conexion para SCP/SFTP y toma dos slots a la vez (todo o nada, sin retener uno mientras espera
+# el otro). Las conexiones al bastion usan BatchMode=yes: requieren autenticacion por clave.
+
+import hashlib
+import os
+import subprocess
+import time
+
+import paramiko
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import (
+    state_path, file_lock, acquire_slot, release_slot
+)
+
+
+# Global variables
+BASTION_MODES = ["direct", "mux"]
+MUX_CHANNELS = 10
+MUX_PERSIST = 600
+MUX_WAIT = 600.0
+MUX_POLL = .25
+SSH_TIMEOUT = 30
+HELD_SLOTS = []
+
+
+# Resuelve host, puerto y hops ProxyJump del dispositivo segun el ssh_config
+def resolve_jump(_sshconf, _host):
+    config = paramiko.SSHConfig.from_path(os.path.expanduser(_sshconf))
+    source = config.lookup(_host)
+    if "proxycommand" in source or "proxyjump" not in source:
+        return None
+    hops = [hop.strip() for hop in source["proxyjump"].split(",") if hop.strip()]
+    return {"hostname": source.get("hostname", _host), "port": int(source.get("port", 22)), "hops": hops}
+
+
+# Destino ssh de un hop ProxyJump ([user@]host[:port])
+def hop_target(_hop):
+    if ":" in _hop and not _hop.startswith("ssh://") and not _hop.startswith("["):
+        return "ssh://" + _hop
+    return _hop
+
+
+# Comando ssh base hacia el ultimo hop, reutilizando el ssh_config del usuario
+def ssh_base(_sshconf, _hops, _control_path):
+    cmd = ["ssh", "-F", os.path.abspath(os.path.expanduser(_sshconf)), "-o", "BatchMode=yes",
+           "-o", "ControlPath={}".format(_control_path)]
+    if len(_hops) > 1:
+        cmd += ["-J", ",".join(_hops[:-1])]
+    return cmd
+
+
+# Levanta (una sola vez por controller) la conexion master al bastion
+def ensure_master(_sshconf, _hops, _control_path, _persist):
+    target = hop_target(_hops[-1])
+    with file_lock(_control_path):
+        check = subprocess.run(ssh_base(_sshconf, _hops, _control_path) + ["-O", "check", target],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=SSH_TIMEOUT)
+        if check.returncode == 0:
+            return True
+        master = subprocess.run(ssh_base(_sshconf, _hops, _control_path) +
+                                ["-o", "ControlMaster=yes", "-o", "ControlPersist={}".format(_persist),
+                                 "-o", "ConnectTimeout={}".format(SSH_TIMEOUT), "-f", "-N", target],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=SSH_TIMEOUT * 2)
+        if master.returncode != 0:
+            raise ConnectionError("bastion {} master connection failed: {}".format(
+                target, master.stderr.decode("utf-8", "replace").strip()))
+    return True
+
+
+# Toma _count slots del semaforo juntos. Retorna la lista de slots o None si vence _wait
+def acquire_channels(_path, _channels, _count=1, _wait=MUX_WAIT):
+    deadline = time.time() + _wait
+    while True:
+        held = []
+        for _index in range(_count):
+            slot = acquire_slot(_path, _channels, 0)
+            if slot is None:
+                break
+            held.append(slot)
+        if len(held) == _count:
+            return held
+        for slot in held:
+            release_slot(slot)
+        if time.time() >= deadline:
+            return None
+        time.sleep(MUX_POLL)
+
+
+# Genera el ssh_config que netmiko usara para el dispositivo: ProxyCommand sobre el master compartido.
+# _sessions es la cantidad de conexiones SSH que el modulo abre al dispositivo
+def bastion_mux(_sshconf, _host, _channels=MUX_CHANNELS, _persist=MUX_PERSIST, _wait=MUX_WAIT, _sessions=1):
+    jump = resolve_jump(_sshconf, _host)
+    if jump is None:
+        return _sshconf
+    key = hashlib.sha1(",".join(jump["hops"]).encode("utf-8")).hexdigest()[:12]
+    control_path = state_path("bastion", "{}.sock".format(key))
+
+    # Limite de canales simultaneos sobre el bastion
+    slots = acquire_channels(state_path("bastion", key), _channels, min(_sessions, _channels), _wait)
+    if slots is None:
+        raise ConnectionError("bastion {} channel limit ({}) reached, waited {}s".format(
+            jump["hops"][-1], _channels, _wait))
+    HELD_SLOTS.extend(slots)
+
+    ensure_master(_sshconf, jump["hops"], control_path, _persist)
+    proxy = ssh_base(_sshconf, jump["hops"], control_path) + [
+        "-o", "ControlMaster=auto", "-o", "ControlPersist={}".format(_persist),
+        "-W", "{}:{}".format(jump["hostname"], jump["port"]), hop_target(jump["hops"][-1])]
+    with open(os.path.expanduser(_sshconf)) as config_fd:
+        original = config_fd.read()
+    mux_config = state_path("bastion", "{}-{}.config".format(key, str(_host).replace("/", "_")))
+    with file_lock(mux_config):
+        with open(mux_config + ".tmp", "w") as config_fd:
+            config_fd.write("Host {}\n    ProxyCommand {}\n\n{}".format(
+                _host, " ".join(proxy).replace("%", "%%"), original))
+        os.rename(mux_config + ".tmp", mux_config)
+    return mux_config
+
+
+# Libera los canales tomados por este proceso
+def release_mux():
+    while HELD_SLOTS:
+        release_slot(HELD_SLOTS.pop())
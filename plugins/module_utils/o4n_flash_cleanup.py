@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Planificador de limpieza de flash para o4n_flash_copy (cleanup: true).
+#
+# Cuando el file a transferir no entra en la flash, se elige sobre el listado de outputFlash el conjunto minimo de
+# files a borrar que libera el espacio que falta. Nunca se borran: las imagenes del boot system, la imagen que
+# esta corriendo, los files de configuracion (CLEANUP_PROTECT), los que coinciden con cleanup_keep ni el file
+# destino. Entre los conjuntos con la menor cantidad de files se prefiere el que borra menos bytes; la busqueda se
+# corta a los CLEANUP_SEARCH pasos con el mejor conjunto encontrado hasta ahi.
+#
+# En IOS-XE install mode el boot system y la imagen corriendo son un .conf (packages.conf) que referencia los
+# .pkg. Se protegen los .pkg listados en el .conf; si no se pudo leer el .conf se protegen todos los .pkg.
+
+import fnmatch
+import posixpath
+import re
+
+
+# Global variables
+CLEANUP_PROTECT = ["*config*", "*.cfg", "*.conf", "*.lic", "vlan.dat", "private-*", "nvram*", "pnp-*",
+                   "tracelogs", "info"]
+RUNNING_IMAGE = r'System image file is "([^"]+)"'
+CONF_PACKAGE = r"(\S+\.pkg)\b"
+DELETE_ERROR = r"%\s*Error|Invalid input"
+CLEANUP_SEARCH = 20000
+
+
+# Nombre de un file en la flash sin file system ni directorio (flash:/dir/x.bin -> x.bin)
+def flash_name(_path):
+    return posixpath.basename(_path.strip().strip("'\"").split(":")[-1])
+
+
+# Imagenes configuradas en las lineas boot system
+def boot_images(_lines):
+    return [flash_name(line.split()[-1]) for line in _lines if line.strip().startswith("boot system")]
+
+
+# Imagen que esta corriendo segun show version
+def running_image(_show_version):
+    match = re.search(RUNNING_IMAGE, _show_version or "")
+    return flash_name(match.group(1)) if match else None
+
+
+# Imagenes de boot (boot system o corriendo) que son un .conf de install mode
+def boot_confs(_boot=None, _running=None):
+    return [image for image in list(_boot or []) + [_running] if image and image.lower().endswith(".conf")]
+
+
+# Paquetes .pkg referenciados por el contenido de un .conf de install mode
+def conf_packages(_conf):
+    return sorted(set(flash_name(match) for match in re.findall(CONF_PACKAGE, _conf or "")))
+
+
+# Files que no se pueden borrar. _packages son los .pkg de los .conf de boot, None si no se leyeron.
+# Retorna {file: motivo}
+def protected_files(_files, _boot=None, _running=None, _keep=None, _dest=None, _packages=None):
+    protect = {}
+    confs = boot_confs(_boot, _running)
+    for name in _files:
+        base = posixpath.basename(name)
+        if base in (_boot or []):
+            protect[name] = "boot image"
+        elif base == _running:
+            protect[name] = "running image"
+        elif confs and base in (_packages or []):
+            protect[name] = "boot package"
+        elif confs and _packages is None and base.lower().endswith(".pkg"):
+            protect[name] = "boot package"
+        elif base == _dest:
+            protect[name] = "destination file"
+        elif any(fnmatch.fnmatch(base, pattern) for pattern in _keep or []):
+            protect[name] = "keep pattern"
+        elif any(fnmatch.fnmatch(base.lower(), pattern) for pattern in CLEANUP_PROTECT):
+            protect[name] = "config file"
+    return protect
+
+
+# Conjunto minimo de files a borrar para liberar _deficit bytes. Retorna (files, bytes) o (None, bytes borrables)
+def plan_cleanup(_files, _deficit, _protect):
+    candidates = sorted(((size, name) for name, size in _files.items() if name not in _protect and size > 0),
+                        reverse=True)
+    if sum(size for size, _name in candidates) < _deficit:
+        return None, sum(size for size, _name in candidates)
+    # primera aproximacion con la menor cantidad de files: el file mas chico que cubre lo que falta, o el mas
+    # grande si ninguno alcanza
+    selected = []
+    remaining = _deficit
+    pending = list(candidates)
+    while remaining > 0:
+        covering = [candidate for candidate in pending if candidate[0] >= remaining]
+        size, name = covering[-1] if covering else pending[0]
+        pending.remove((size, name))
+        selected.append(name)
+        remaining -= size
+    best = {"files": selected, "bytes": _deficit - remaining, "steps": CLEANUP_SEARCH}
+
+    # entre los conjuntos con la misma cantidad de files, el que cubre _deficit borrando menos bytes
+    def search(_start, _left, _chosen, _bytes):
+        if _left == 0:
+            if _deficit <= _bytes < best["bytes"]:
+                best.update(files=_chosen, bytes=_bytes)
+            return
+        for index in range(_start, len(candidates) - _left + 1):
+            best["steps"] -= 1
+            size, name = candidates[index]
+            # los files siguientes son mas chicos: si los _left mas grandes desde aca no alcanzan, ninguno alcanza
+            if best["steps"] < 0 or _bytes + sum(size for size, _name in candidates[index:index + _left]) < _deficit:
+                return
+            if _bytes + size < best["bytes"]:
+                search(index + 1, _left - 1, _chosen + [name], _bytes + size)
+
+    if len(selected) > 1:
+        search(0, len(selected), [], 0)
+    return best["files"], best["bytes"]
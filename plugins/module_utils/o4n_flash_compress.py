@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Compresion en linea para o4n_flash_copy (compression).
+#
+#   - put: el file se empaqueta localmente en un tar.gz, se transfiere con el transporte elegido y el dispositivo
+#     lo extrae con "archive tar /xtract" en el directorio destino. El archivo temporal se borra de la flash. El
+#     chequeo de espacio suma el tar.gz al file: ambos estan juntos en la flash durante la extraccion.
+#   - get: el dispositivo empaqueta el file con "archive tar /create <fs>/o4n_<file>.tar.gz", se recibe y se
+#     desempaqueta en un pipeline (un thread lee el archivo desde un pipe mientras llega) hacia d_file o el store.
+#     IOS escribe un tar sin comprimir aunque el nombre termine en .gz: el formato se detecta al leer.
+#   - auto: comprime solo si vale la pena. En put se mide el ratio de una muestra del file; en get se omiten
+#     las extensiones que ya vienen comprimidas (imagenes, paquetes, tar, gz). Si el paso archive falla en el
+#     dispositivo antes de escribir datos, la transferencia sigue sin comprimir. Con archive el error es fatal.
+#
+# La capa se monta sobre el FileTransfer despues del transporte, asi tranfer_logic no cambia. La integridad se
+# verifica siempre con el md5 del file sin comprimir y el resultado reporta los bytes en el cable. Si el tar.gz
+# temporal no se puede borrar se descarta el listado guardado del host (o4n_flash_scan).
+
+import atexit
+import os
+import posixpath
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_prompt import send_cmd
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_scan import drop_scan
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_transport import (
+    PullTransfer, receive_file
+)
+
+
+# Global variables
+COMPRESS_MODES = ["no", "auto", "archive"]
+COMPRESS_LEVEL = 6
+COMPRESS_SAMPLE = 1024 * 1024
+COMPRESS_MIN_RATIO = 1.2
+COMPRESSED_EXT = (".bin", ".pkg", ".gz", ".tgz", ".tar", ".zip", ".bz2", ".xz", ".7z", ".img", ".iso", ".SPA")
+ARCHIVE_PREFIX = "o4n_"
+ARCHIVE_ERROR = r"%\s*Error|Invalid input|[Ff]ailed"
+PIPE_BLOCK = 65536
+
+
+# Ratio de compresion de una muestra del file local
+def sample_ratio(_path, _sample=COMPRESS_SAMPLE):
+    with open(_path, "rb") as local_fd:
+        data = local_fd.read(_sample)
+    return float(len(data)) / len(zlib.compress(data, 1)) if data else 1.0
+
+
+# Decide si se comprime la transferencia
+def should_compress(_compress, _direction, _source_file):
+    if _compress in ["no", None, False]:
+        return False
+    if _compress == "archive":
+        return True
+    if _direction == "put":
+        return sample_ratio(_source_file) >= COMPRESS_MIN_RATIO
+    return not _source_file.lower().endswith(tuple(ext.lower() for ext in COMPRESSED_EXT))
+
+
+# Ejecuta un archive tar en el dispositivo. Retorna la salida
+def archive_cmd(_device, _cmd, _mode="delay", _timeouts=None):
+    output = send_cmd(_device, _cmd, "archive", _mode, _timeouts)
+    if re.search(ARCHIVE_ERROR, output):
+        raise IOError("{} failed: {}".format(" ".join(_cmd.split()[:3]), " ".join(output.split())[-200:]))
+    return output
+
+
+# Transferencia comprimida montada sobre un FileTransfer
+class CompressedTransfer(object):
+    def __init__(self, _scp_transfer, _compress="archive", _level=COMPRESS_LEVEL, _mode="delay", _timeouts=None):
+        self.ft = _scp_transfer
+        self.device = _scp_transfer.ssh_ctl_chan
+        self.compress = _compress
+        self.level = _level or COMPRESS_LEVEL
+        self.mode = _mode
+        self.timeouts = _timeouts
+        self.put_raw = _scp_transfer.put_file
+        self.space_raw = _scp_transfer.verify_space_available
+        self.workdir = None
+        self.local = None
+
+    def remote(self, _path):
+        return "{}/{}".format(self.ft.file_system, _path.lstrip("/"))
+
+    # tar.gz temporal en la flash, junto al file
+    def archive_name(self, _path):
+        directory, name = posixpath.split(_path)
+        return posixpath.join(directory, "{}{}.tar.gz".format(ARCHIVE_PREFIX, name))
+
+    # El FileTransfer mueve el tar.gz en vez del file
+    @contextmanager
+    def swap(self, _source, _dest, _size):
+        saved = (self.ft.source_file, self.ft.dest_file, self.ft.file_size)
+        self.ft.source_file, self.ft.dest_file, self.ft.file_size = _source, _dest, _size
+        try:
+            yield
+        finally:
+            self.ft.source_file, self.ft.dest_file, self.ft.file_size = saved
+
+    def delete_archive(self, _archive):
+        try:
+            send_cmd(self.device, "delete /force {}".format(self.remote(_archive)), "config", self.mode,
+                     self.timeouts)
+        except Exception:
+            # el tar.gz pudo quedar en la flash: el listado guardado ya no es valido
+            drop_scan(self.device.host)
+
+    def report(self, _bytes, _wire):
+        self.ft.compress_ref = {"bytes": _bytes, "wire_bytes": _wire, "saved_bytes": _bytes - _wire,
+                                "ratio": round(float(_bytes) / _wire, 2) if _wire else None}
+
+    # tar.gz local del put, se arma una sola vez
+    def prepare(self):
+        if self.local is None:
+            self.workdir = tempfile.mkdtemp(prefix="o4n_flash_")
+            atexit.register(shutil.rmtree, self.workdir, True)
+            self.local = os.path.join(self.workdir, posixpath.basename(self.archive_name(self.ft.dest_file)))
+            with tarfile.open(self.local, "w:gz", compresslevel=self.level) as tar:
+                tar.add(self.ft.source_file, arcname=posixpath.basename(self.ft.dest_file))
+        return os.path.getsize(self.local)
+
+    # En put el tar.gz y el file extraido ocupan la flash a la vez
+    def verify_space(self, *_args, **_kwargs):
+        if self.ft.direction != "put":
+            return self.space_raw(*_args, **_kwargs)
+        self.ft.extra_space = self.prepare()
+        return self.ft.remote_space_available() > self.ft.file_size + self.ft.extra_space
+
+    def put(self):
+        directory = posixpath.dirname(self.ft.dest_file)
+        archive = self.archive_name(self.ft.dest_file)
+        try:
+            wire = self.prepare()
+            try:
+                with self.swap(self.local, archive, wire):
+                    self.put_raw()
+                archive_cmd(self.device, "archive tar /xtract {} {}".format(self.remote(archive),
+                                                                            self.remote(directory)),
+                            self.mode, self.timeouts)
+                extracted = True
+            except IOError:
+                if self.compress != "auto":
+                    raise
+                extracted = False
+            finally:
+                self.delete_archive(archive)
+        finally:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            self.local = None
+        if not extracted:
+            # el dispositivo no pudo extraer: se transfiere sin comprimir. El put anterior cerro la conexion
+            self.ft.establish_scp_conn()
+            self.put_raw()
+            return
+        self.report(os.path.getsize(self.ft.source_file), wire)
+
+    # Recibe el get comprimido y escribe en _fd el file descomprimido
+    def receive(self, _fd):
+        directory, name = posixpath.split(self.ft.source_file)
+        archive = self.archive_name(self.ft.source_file)
+        state = {"bytes": 0, "found": False, "error": None}
+        try:
+            archive_cmd(self.device, "archive tar /create {} {} {}".format(self.remote(archive),
+                                                                           self.remote(directory), name),
+                        self.mode, self.timeouts)
+            wire = self.ft.remote_file_size(remote_file=archive)
+            read_fd, write_fd = os.pipe()
+            reader = threading.Thread(target=self.extract, args=(os.fdopen(read_fd, "rb"), name, _fd, state))
+            reader.start()
+            try:
+                with os.fdopen(write_fd, "wb") as pipe_fd:
+                    with self.swap(archive, self.ft.dest_file, wire):
+                        receive_file(self.ft, pipe_fd)
+            finally:
+                reader.join()
+            if state["error"]:
+                raise IOError("decompression of {} failed: {}".format(archive, state["error"]))
+        except IOError:
+            if self.compress != "auto" or state["bytes"]:
+                raise
+            # archive fallo antes de escribir datos: se recibe sin comprimir
+            receive_file(self.ft, _fd)
+            return
+        finally:
+            self.delete_archive(archive)
+        self.report(state["bytes"], wire)
+
+    # Thread del pipeline: lee el tar.gz del pipe y escribe el file en _fd
+    def extract(self, _pipe, _name, _fd, _state):
+        try:
+            with tarfile.open(fileobj=_pipe, mode="r|*") as tar:
+                for member in tar:
+                    if member.isfile() and posixpath.basename(member.name) == _name:
+                        _state["found"] = True
+                        data = tar.extractfile(member)
+                        for chunk in iter(lambda: data.read(PIPE_BLOCK), b""):
+                            _fd.write(chunk)
+                            _state["bytes"] += len(chunk)
+            if not _state["found"]:
+                _state["error"] = "{} not found in archive".format(_name)
+        except Exception as error:
+            _state["error"] = error
+        finally:
+            # vacia el pipe para no bloquear la recepcion
+            for _chunk in iter(lambda: _pipe.read(PIPE_BLOCK), b""):
+                pass
+            _pipe.close()
+
+    def get(self):
+        with open(self.ft.dest_file, "wb") as local_fd:
+            self.receive(local_fd)
+
+    def transfer(self):
+        if self.ft.direction == "put":
+            self.put()
+        else:
+            self.get()
+
+
+# Monta la compresion sobre un FileTransfer. Los bytes en el cable quedan en _scp_transfer.compress_ref
+def attach_compression(_scp_transfer, _compress, _level=COMPRESS_LEVEL, _mode="delay", _timeouts=None):
+    _scp_transfer.compress_ref = None
+    _scp_transfer.compressed = should_compress(_compress, _scp_transfer.direction, _scp_transfer.source_file)
+    if not _scp_transfer.compressed:
+        return _scp_transfer
+    engine = getattr(_scp_transfer, "engine", None)
+    if isinstance(engine, PullTransfer) and not engine.serve:
+        raise ValueError("compression with xfer_mode pull requires pull_serve")
+    compressed = CompressedTransfer(_scp_transfer, _compress, _level, _mode, _timeouts)
+    _scp_transfer.transfer_file = compressed.transfer
+    _scp_transfer.verify_space_available = compressed.verify_space
+    if _scp_transfer.direction == "put":
+        _scp_transfer.put_file = compressed.put
+    else:
+        _scp_transfer.get_file = compressed.get
+        _scp_transfer.receiver = compressed.receive
+    return _scp_transfer
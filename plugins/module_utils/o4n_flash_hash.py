@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Hashing de imagenes para o4n_flash_copy (hash_algorithm, s_file lista).
+#
+# Los files locales se hashean en paralelo (un thread por file, hashlib libera el GIL) con lecturas grandes sobre
+# un buffer reutilizado, y en una sola pasada para todos los algoritmos pedidos. Los digests se guardan en
+# hashes.json por (path, tamano, mtime): una imagen que no cambio no se vuelve a leer en el proximo play.
+# Del lado del dispositivo, los verify /md5 | /sha256 | /sha512 de todos los files se ejecutan en lote sobre la
+# misma sesion. Si el dispositivo no soporta el algoritmo pedido se usa md5.
+#
+# El motor se monta sobre el FileTransfer (creado con hash_supported=False): compare_md5 compara con el
+# algoritmo elegido y file_md5 usa el hashing local con cache.
+
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import (
+    state_path, read_json, locked_json
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_prompt import send_cmd
+
+
+# Global variables
+HASH_ALGOS = ["md5", "sha256", "sha512"]
+HASH_BLOCK = 4 * 1024 * 1024
+HASH_WORKERS = 4
+HASH_FILE = "hashes.json"
+HASH_TTL = 30 * 24 * 3600
+VERIFY_DIGEST = r"=\s*([0-9a-fA-F]{32,})"
+VERIFY_UNSUPPORTED = r"Invalid input|Unknown|not supported"
+
+
+# Key del cache de un file local: cambia si cambia el tamano o el mtime
+def file_key(_path):
+    stat = os.stat(_path)
+    return "{}:{}:{}".format(os.path.realpath(_path), stat.st_size, stat.st_mtime_ns)
+
+
+# Hashea un file en una pasada para todos los algoritmos
+def hash_file(_path, _algos=("md5",), _block=HASH_BLOCK):
+    hashes = [hashlib.new(algo) for algo in _algos]
+    buffer = bytearray(_block)
+    view = memoryview(buffer)
+    with open(_path, "rb", buffering=0) as local_fd:
+        while True:
+            size = local_fd.readinto(buffer)
+            if not size:
+                break
+            for digest in hashes:
+                digest.update(view[:size])
+    return {algo: digest.hexdigest() for algo, digest in zip(_algos, hashes)}
+
+
+# Digests de varios files locales, en paralelo y con cache. Retorna {path: {algo: digest}}
+def local_hashes(_paths, _algos=("md5",), _workers=HASH_WORKERS):
+    paths = list(dict.fromkeys(_paths))
+    keys = {path: file_key(path) for path in paths}
+    cache = read_json(state_path(HASH_FILE))
+    results = {}
+    pending = []
+    for path in paths:
+        entry = cache.get(keys[path], {})
+        if all(algo in entry for algo in _algos):
+            results[path] = {algo: entry[algo] for algo in _algos}
+        else:
+            pending.append(path)
+    if not pending:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(_workers or HASH_WORKERS, len(pending)))) as pool:
+        for path, digests in zip(pending, pool.map(lambda path: hash_file(path, _algos), pending)):
+            results[path] = digests
+    now = time.time()
+    with locked_json(state_path(HASH_FILE)) as cache:
+        for path in pending:
+            cache[keys[path]] = dict(cache.get(keys[path], {}), time=now, **results[path])
+        for key in [key for key, value in cache.items() if now - value.get("time", 0) > HASH_TTL]:
+            del cache[key]
+    return results
+
+
+# Digest de la salida de un verify, o None
+def parse_verify(_output):
+    match = re.search(VERIFY_DIGEST, _output)
+    return match.group(1).lower() if match else None
+
+
+# verify de varios files del dispositivo en la misma sesion. Retorna (algo usado, {path: digest o None})
+def remote_hashes(_device, _paths, _algo="md5", _mode="delay", _timeouts=None):
+    results = {}
+    for path in _paths:
+        output = send_cmd(_device, "verify /{} {}".format(_algo, path), "verify", _mode, _timeouts)
+        if _algo != "md5" and not results and re.search(VERIFY_UNSUPPORTED, output):
+            return remote_hashes(_device, _paths, "md5", _mode, _timeouts)
+        results[path] = parse_verify(output)
+    return _algo, results
+
+
+# Monta el motor de hashing sobre un FileTransfer. _digest es el digest del origen si ya se calculo en lote
+def attach_hashes(_scp_transfer, _algo="md5", _digest=None, _mode="delay", _timeouts=None):
+    device = _scp_transfer.ssh_ctl_chan
+    state = {"algo": _algo or "md5", "source": _digest}
+    _scp_transfer.hash_ref = None
+
+    def remote(_path):
+        algo, digests = remote_hashes(device, ["{}/{}".format(_scp_transfer.file_system, _path)], state["algo"],
+                                      _mode, _timeouts)
+        if algo != state["algo"]:
+            state.update(algo=algo, source=None)
+        return list(digests.values())[0]
+
+    def local(_path):
+        return local_hashes([_path], [state["algo"]])[_path][state["algo"]]
+
+    def compare():
+        if _scp_transfer.direction == "put":
+            dest = remote(_scp_transfer.dest_file)
+            source = state["source"] = state["source"] or local(_scp_transfer.source_file)
+        else:
+            source = state["source"] = state["source"] or remote(_scp_transfer.source_file)
+            dest = local(_scp_transfer.dest_file) if os.path.isfile(_scp_transfer.dest_file) else None
+        _scp_transfer.hash_ref = {"algorithm": state["algo"], "digest": source}
+        return source is not None and source == dest
+
+    _scp_transfer.compare_md5 = compare
+    _scp_transfer.file_md5 = lambda file_name, add_newline=False: local_hashes([file_name])[file_name]["md5"]
+    return _scp_transfer
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Transferencias en background (background: true) y su estado.
+#
+# o4n_flash_copy crea el job, se desacopla del proceso de Ansible (doble fork + setsid) y retorna el job_id de
+# inmediato. El proceso desacoplado ejecuta la transferencia y escribe su estado en jobs/<job_id>.json:
+# phase, bytes enviados, rate, ETA y, al terminar, el resultado con el mismo formato de std_out del modulo.
+# El estado se actualiza desde el callback de progreso de la transferencia, a lo sumo cada JOB_REFRESH
+# segundos. El resultado se enmascara igual que el log (los errores de copy pueden incluir la URL con password).
+# o4n_flash_status lee esos files.
+#
+# El payload de AnsiballZ se borra cuando el proceso original retorna: el proceso desacoplado no puede importar
+# nada nuevo. detach importa antes del fork los modulos que la transferencia carga recien al usarlos (JOB_PRELOAD).
+
+import importlib
+import os
+import time
+import uuid
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import (
+    state_path, read_json, write_json
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_sched import pid_alive
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_log import (
+    secret_list, redact, redact_data
+)
+
+
+# Global variables
+JOB_REFRESH = .5
+JOB_TTL = 7 * 24 * 3600
+JOB_PHASES = ["starting", "connecting", "queued", "checking", "transferring", "verifying", "done", "failed"]
+JOB_FINAL = ["done", "failed"]
+# tarfile importa gzip al abrir un tar.gz (compression)
+JOB_PRELOAD = ["gzip"]
+
+
+# Path del file de estado de un job
+def job_path(_job_id):
+    return state_path("jobs", "{}.json".format(_job_id))
+
+
+# Estado de un job. Un job sin terminar cuyo proceso murio se reporta como failed
+def read_job(_job_id):
+    status = read_json(job_path(_job_id))
+    if status and status["phase"] not in JOB_FINAL and not pid_alive(status.get("pid", 0)):
+        status["phase"] = "failed"
+        status["result"] = {"success": False, "msg": "Background transfer process {} is gone".format(
+            status.get("pid")), "std_out": {}}
+    return status
+
+
+# Borra los files de jobs terminados hace mas de JOB_TTL
+def purge_jobs():
+    directory = os.path.dirname(job_path("x"))
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith(".json") and now - os.path.getmtime(path) > JOB_TTL:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+# Job de transferencia en background
+class TransferJob(object):
+    def __init__(self, _host, _file, _operation, _secrets=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.path = job_path(self.id)
+        self.status = {"job_id": self.id, "host": _host, "file": _file, "operation": _operation,
+                       "pid": os.getpid(), "phase": "starting", "bytes_total": 0, "bytes_sent": 0, "rate": 0.0,
+                       "eta": None, "started": time.time(), "updated": time.time(), "result": None}
+        self.transfer_start = None
+        self.written = 0
+        self.secrets = secret_list(_secrets)
+        self.save()
+
+    def save(self):
+        self.status["updated"] = time.time()
+        write_json(self.path, self.status)
+        self.written = self.status["updated"]
+
+    def phase(self, _phase):
+        self.status["phase"] = _phase
+        self.save()
+
+    # Callback de progreso (filename, size, sent)
+    def progress(self, _filename, _size, _sent):
+        now = time.time()
+        if self.transfer_start is None or _sent < self.status["bytes_sent"]:
+            self.transfer_start = now
+            self.status["phase"] = "transferring"
+        elapsed = now - self.transfer_start
+        rate = _sent / elapsed if elapsed > 0 else 0.0
+        self.status.update({"bytes_total": _size, "bytes_sent": _sent, "rate": round(rate, 1),
+                            "eta": round((_size - _sent) / rate, 1) if rate else None})
+        if now - self.written >= JOB_REFRESH or _sent >= _size:
+            self.save()
+
+    def finish(self, _success, _msg, _output):
+        self.status["phase"] = "done" if _success else "failed"
+        self.status["eta"] = 0 if _success else None
+        self.status["result"] = {"success": _success, "msg": redact(str(_msg), self.secrets),
+                                 "std_out": redact_data(_output, self.secrets)}
+        self.save()
+
+
+# Se desacopla del proceso de Ansible. Retorna True en el proceso desacoplado y False en el original
+def detach(_job):
+    for name in JOB_PRELOAD:
+        importlib.import_module(name)
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+    if pid:
+        os.close(ready_w)
+        os.waitpid(pid, 0)
+        # espera a que el proceso desacoplado registre su pid en el estado del job
+        os.read(ready_r, 1)
+        os.close(ready_r)
+        return False
+    os.close(ready_r)
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in [0, 1, 2]:
+        os.dup2(devnull, fd)
+    _job.status["pid"] = os.getpid()
+    _job.save()
+    os.write(ready_w, b"1")
+    os.close(ready_w)
+    return True
+
+
+# Encadena callbacks de progreso
+def chain_progress(*_callbacks):
+    callbacks = [callback for callback in _callbacks if callback]
+    if len(callbacks) < 2:
+        return callbacks[0] if callbacks else None
+
+    def progress(_filename, _size, _sent):
+        for callback in callbacks:
+            callback(_filename, _size, _sent)
+    return progress
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Log de sesion de los modulos (log: yes).
+#
+# Los records se encolan con un QueueHandler y un QueueListener los escribe desde su propio thread, asi el thread
+# de la transferencia nunca espera el disco. Cada host escribe en <log_path>/o4n_ssh_<host>.log, rotado por
+# tamano (log_max_bytes, LOG_BACKUPS files viejos). Los passwords del modulo, las lineas password/secret de la
+# configuracion y las credenciales de las URL (scp://user:pass@) se reemplazan por ******** antes de escribir.
+#
+# log_level:
+#   info: conexion, autenticacion y resultado (INFO)
+#   debug: ademas la sesion completa de netmiko (DEBUG salvo el transporte, que queda en INFO)
+#   transport: ademas el debug de paramiko y scp por paquete; solo para diagnosticar el transporte
+
+import atexit
+import logging
+import os
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+# Global variables
+LOG_LEVELS = ["info", "debug", "transport"]
+LOG_PATH = "./documentacion/"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s"
+LOG_TRANSPORT = ["paramiko", "scp"]
+LOG_MASK = "********"
+LOG_SECRET_LINE = r"(\b(?:password|secret|key-string)\s+(?:\d\s+)?)\S+"
+LOG_SECRET_URL = r"(://[^:/@\s]+:)[^@\s]+(@)"
+
+
+# Secretos a enmascarar, los mas largos primero. Se omiten los vacios y los de 1-2 caracteres
+def secret_list(_secrets=None):
+    return sorted(set(str(secret) for secret in _secrets or [] if secret and len(str(secret)) > 2),
+                  key=len, reverse=True)
+
+
+# Enmascara los secretos, las credenciales de URL y las lineas password/secret de un texto. _secrets viene de
+# secret_list
+def redact(_text, _secrets=None):
+    for secret in _secrets or []:
+        _text = _text.replace(secret, LOG_MASK)
+    _text = re.sub(LOG_SECRET_URL, r"\1" + LOG_MASK + r"\2", _text)
+    return re.sub(LOG_SECRET_LINE, r"\1" + LOG_MASK, _text, flags=re.IGNORECASE)
+
+
+# Password de una URL user:pass@host, o None
+def url_password(_url):
+    match = re.search(r"://[^:/@\s]+:([^@\s]+)@", _url or "")
+    return match.group(1) if match else None
+
+
+# Enmascara los textos de un resultado (dict, list o str)
+def redact_data(_data, _secrets=None):
+    if isinstance(_data, dict):
+        return dict((key, redact_data(value, _secrets)) for key, value in _data.items())
+    if isinstance(_data, (list, tuple)):
+        return [redact_data(value, _secrets) for value in _data]
+    if isinstance(_data, str):
+        return redact(_data, _secrets)
+    return _data
+
+
+# Reemplaza los secretos en el mensaje del record. Corre en el thread del listener
+class RedactFilter(logging.Filter):
+    def __init__(self, _secrets=None):
+        logging.Filter.__init__(self)
+        self.secrets = secret_list(_secrets)
+
+    def filter(self, _record):
+        _record.msg = redact(_record.getMessage(), self.secrets)
+        _record.args = None
+        return True
+
+
+# Nombre del log de un host
+def log_file(_host, _path=LOG_PATH):
+    return os.path.join(_path, "o4n_ssh_{}.log".format(re.sub(r"[^\w.-]", "_", str(_host))))
+
+
+# Inicia el pipeline de log. Retorna el QueueListener (se detiene solo al salir del proceso)
+def start_log(_host, _path=LOG_PATH, _level="info", _max_bytes=LOG_MAX_BYTES, _secrets=None):
+    path = log_file(_host, _path or LOG_PATH)
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    handler = RotatingFileHandler(path, maxBytes=_max_bytes or LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RedactFilter(_secrets))
+    records = queue.Queue(-1)
+    listener = QueueListener(records, handler)
+    listener.start()
+    atexit.register(stop_log, listener)
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(records))
+    root.setLevel(logging.INFO if _level == "info" else logging.DEBUG)
+    # el ruido por paquete del transporte no se genera salvo en transport
+    for name in LOG_TRANSPORT:
+        logging.getLogger(name).setLevel(logging.DEBUG if _level == "transport" else logging.INFO)
+    return listener
+
+
+# Vacia la cola y cierra el file
+def stop_log(_listener):
+    if _listener is not None and getattr(_listener, "_thread", None) is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
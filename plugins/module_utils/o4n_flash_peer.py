@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Distribucion peer-seeded de imagenes (distribution: peer).
+#
+# Los forks de o4n_flash_copy de un mismo sitio se coordinan en peer/<key>.json (key = sitio + file + tamano):
+#   - los primeros peer_seeds dispositivos del sitio son seeds: reciben el file desde el controller
+#   - el resto espera a que algun dispositivo del sitio tenga el file verificado (md5) y lo trae de ahi por la
+#     LAN con copy <peer_url> ejecutado en el dispositivo
+#   - cada dispositivo verificado pasa a ser fuente, de modo que la distribucion crece en arbol. La fuente publica
+#     el path del file en su flash (d_path/d_file), que es el que traen los demas
+#   - cada fuente atiende a lo sumo peer_fanout copias simultaneas (semaforo entre procesos)
+# Si la copia desde una fuente falla, ese dispositivo no vuelve a usarla y reintenta desde otra; si no le queda
+# ninguna, recibe el file desde el controller como un seed mas. El fallo puede ser del dispositivo que copia, asi que
+# la fuente se descarta para todos recien cuando fallan PEER_FAILS dispositivos distintos; si era un seed su lugar
+# queda libre. Si un seed falla o su proceso muere, otro dispositivo del sitio toma su lugar.
+
+import hashlib
+import os
+import time
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import (
+    state_path, locked_json, acquire_slot, release_slot
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_sched import pid_alive
+
+
+# Global variables
+DISTRIBUTION_MODES = ["direct", "peer"]
+PEER_URL = "scp://{user}:{password}@{address}/{fsystem}"
+PEER_POLL = 1.0
+PEER_TTL = 6 * 3600
+PEER_FAILS = 3
+
+
+# Key de una distribucion
+def peer_key(_site, _file, _size):
+    return hashlib.sha1("{}|{}|{}".format(_site, _file, _size).encode("utf-8")).hexdigest()[:16]
+
+
+# URL de la flash de una fuente. El file se trae de <url>/<path publicado por la fuente>
+def peer_url(_template, _source, _user, _password):
+    return (_template or PEER_URL).format(user=_user, password=_password, address=_source["address"],
+                                          fsystem=_source["fsystem"], host=_source["host"])
+
+
+# Descarta seeds de procesos muertos y fuentes vencidas
+def expire(_dist):
+    now = time.time()
+    for host in [key for key, value in _dist["seeds"].items()
+                 if not value.get("done") and not pid_alive(value["pid"])]:
+        del _dist["seeds"][host]
+    for host in [key for key, value in _dist["sources"].items() if now - value["time"] > PEER_TTL]:
+        del _dist["sources"][host]
+    return _dist
+
+
+# Rol del dispositivo en la distribucion. Retorna (role, source, slot):
+#   ("seed", None, None): transferir desde el controller
+#   ("peer", source, slot): copiar desde source; liberar slot con release_source
+#   (None, None, None): vencio _timeout sin fuente disponible
+def peer_source(_peer, _host, _size):
+    path = state_path("peer", "{}.json".format(peer_key(_peer["site"], _peer["file"], _size)))
+    deadline = time.time() + _peer["timeout"]
+    while True:
+        with locked_json(path) as dist:
+            dist.setdefault("seeds", {})
+            dist.setdefault("sources", {})
+            expire(dist)
+            ready = sorted([value for value in dist["sources"].values()
+                            if value["host"] != _host and _host not in value.get("failed", [])],
+                           key=lambda value: value["time"])
+            # sin fuentes que no le hayan fallado, el dispositivo recibe el file desde el controller
+            failed = any(_host in value.get("failed", []) for value in dist["sources"].values())
+            if not ready and (failed or len(dist["seeds"]) < _peer["seeds"]):
+                dist["seeds"][_host] = {"pid": os.getpid(), "time": time.time(), "done": False}
+                return "seed", None, None
+        for source in ready:
+            slot = acquire_slot(state_path("peer", "{}-{}".format(peer_key(_peer["site"], _peer["file"], _size),
+                                                                   source["host"])), _peer["fanout"], 0)
+            if slot is not None:
+                return "peer", source, slot
+        if time.time() >= deadline:
+            return None, None, None
+        time.sleep(PEER_POLL)
+
+
+# Publica el resultado del dispositivo: si tiene el file verificado pasa a ser fuente
+def publish_source(_peer, _host, _size, _role, _success, _failed_source=None):
+    path = state_path("peer", "{}.json".format(peer_key(_peer["site"], _peer["file"], _size)))
+    with locked_json(path) as dist:
+        dist.setdefault("seeds", {})
+        dist.setdefault("sources", {})
+        if _role == "seed":
+            if _success:
+                dist["seeds"].setdefault(_host, {"pid": os.getpid(), "time": time.time()})["done"] = True
+            else:
+                dist["seeds"].pop(_host, None)
+        source = dist["sources"].get(_failed_source)
+        if source is not None:
+            failed = source.setdefault("failed", [])
+            if _host not in failed:
+                failed.append(_host)
+            if len(failed) >= PEER_FAILS:
+                del dist["sources"][_failed_source]
+                # el seed descartado deja su lugar a otro dispositivo
+                dist["seeds"].pop(_failed_source, None)
+        if _success:
+            dist["sources"][_host] = {"host": _host, "address": _peer["address"], "fsystem": _peer["fsystem"],
+                                      "path": _peer["path"], "time": time.time(), "failed": []}
+
+
+# Libera el slot tomado sobre la fuente
+def release_source(_slot):
+    release_slot(_slot)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Modo plan (plan: true): calcula sin conectarse el trabajo que haria cada modulo.
+#
+# Evalua el mismo arbol de decision de tranfer_logic (espacio, existencia, md5) y de chgLoader (imagen en flash,
+# boot system actual) contra el cache de scans (o4n_flash_scan) de no mas de plan_max_age segundos. Cada
+# dispositivo recibe una accion, los bytes a transferir y una duracion estimada con el throughput aprendido del
+# host (o plan_rate). needs_connection indica si la ejecucion real tiene algo que hacer en el dispositivo.
+#
+# Acciones:
+#   none: nada que hacer
+#   scan: no hay scan en cache o es mas viejo que plan_max_age. Con cleanup tambien si no se conocen el boot system
+#         y la imagen que esta corriendo (o4n_flash_dir con scan_boot)
+#   transfer: el file no esta en destino o su tamano difiere (md5 fallaria)
+#   verify: el file existe con el mismo tamano, solo el md5 en el dispositivo decide
+#   no_space: la flash no tiene espacio para el file (disk_space Fail)
+#   cleanup: no hay espacio pero cleanup puede liberarlo; reason lista los files que se borrarian
+#   missing: el file de origen no existe (get)
+#   blocked: la imagen a bootear no esta en la flash
+#   change_loader: hay que cambiar el boot system
+
+import os
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_scan import (
+    load_scan, load_boot, load_running
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_cleanup import (
+    boot_images, protected_files, plan_cleanup
+)
+
+
+# Global variables
+PLAN_MAX_AGE = 3600
+PLAN_RATE = 1000000
+
+
+# Entrada del plan de un dispositivo
+def plan_entry(_host, _action, _reason, _bytes=0, _rate=0, _age=None):
+    return {"host": _host, "action": _action, "reason": _reason, "bytes": _bytes,
+            "duration_s": round(float(_bytes) / _rate, 1) if _bytes and _rate else 0,
+            "scan_age_s": _age, "needs_connection": _action != "none"}
+
+
+# Scan no disponible
+def plan_no_scan(_host, _flash, _age):
+    if _age is None:
+        return plan_entry(_host, "scan", "no cached scan of {}".format(_flash))
+    return plan_entry(_host, "scan", "cached scan of {} is {}s old".format(_flash, int(_age)), _age=_age)
+
+
+# Plan de o4n_flash_dir. Retorna (plan, entry del cache)
+def plan_scan(_host, _flash, _max_age=PLAN_MAX_AGE):
+    entry, age = load_scan(_host, _flash, _max_age)
+    if entry is None:
+        return plan_no_scan(_host, _flash, age), None
+    return plan_entry(_host, "none", "cached scan is fresh", _age=age), entry
+
+
+# Plan de o4n_flash_copy: arbol de decision de tranfer_logic
+def plan_transfer(_host, _flash, _operation, _source_file, _dest_file, _dfile, _sfile, _dmd5=False,
+                  _max_age=PLAN_MAX_AGE, _rate=PLAN_RATE, _cleanup=None):
+    entry, age = load_scan(_host, _flash, _max_age)
+    if entry is None:
+        return plan_no_scan(_host, _flash, age)
+    files = entry["files"]
+    if _operation == "put":
+        if not os.path.isfile(_source_file):
+            return plan_entry(_host, "missing", "local file {} not found".format(_source_file), _age=age)
+        size = os.path.getsize(_source_file)
+        exists = _dfile in files
+        dest_size = files.get(_dfile)
+        # cleanup no borra nada si el destino ya esta (md5 decide) y descuenta el destino que se reemplaza
+        deficit = size - entry["bytes_free"] - (dest_size or 0)
+        if _cleanup is not None and deficit > 0 and not (exists and (_dmd5 or dest_size == size)):
+            # sin boot system o imagen corriendo el plan podria proponer borrarlos. Los .pkg de un .conf de boot se
+            # protegen todos
+            lines, _boot_age = load_boot(_host, _max_age)
+            running, _running_age = load_running(_host, _max_age)
+            if lines is None or running is None:
+                return plan_entry(_host, "scan", "boot system or running image of {} unknown, scan with scan_boot"
+                                  .format(_host), _age=age)
+            protect = protected_files(files, boot_images(lines), running, _cleanup, _dfile)
+            delete, freed = plan_cleanup(files, deficit, protect)
+            if delete is not None:
+                return plan_entry(_host, "cleanup", "delete {} to free {} bytes".format(", ".join(delete), freed),
+                                  size, _rate, age)
+            return plan_entry(_host, "no_space", "needs {} bytes, {} bytes free and {} deletable".format(
+                size, entry["bytes_free"], freed), _age=age)
+        if size > entry["bytes_free"] and _cleanup is None:
+            return plan_entry(_host, "no_space", "needs {} bytes, {} bytes free".format(size, entry["bytes_free"]),
+                              _age=age)
+    else:
+        if _sfile not in files:
+            return plan_entry(_host, "missing", "{} not found in {}".format(_sfile, _flash), _age=age)
+        size = files[_sfile]
+        exists = os.path.isfile(_dest_file)
+        dest_size = os.path.getsize(_dest_file) if exists else None
+    if not exists:
+        return plan_entry(_host, "transfer", "file not in destination", size, _rate, age)
+    if _dmd5:
+        return plan_entry(_host, "none", "file exists, md5 check disabled", _age=age)
+    if dest_size != size:
+        return plan_entry(_host, "transfer", "file exists with size {}, expected {}".format(dest_size, size), size,
+                          _rate, age)
+    return plan_entry(_host, "verify", "file exists with the same size, md5 decides", 0, _rate, age)
+
+
+# Plan de o4n_flash_chgldr: imagen en flash y diff del boot system
+def plan_loader(_host, _flash, _image, _boot_cmd, _max_age=PLAN_MAX_AGE):
+    lines, boot_age = load_boot(_host, _max_age)
+    target = [] if _image == "clean" else [" ".join((_boot_cmd + _image).split())]
+    if _image != "clean":
+        entry, age = load_scan(_host, _flash, _max_age)
+        if entry is None:
+            return plan_no_scan(_host, _flash, age)
+        if _image not in entry["files"]:
+            return plan_entry(_host, "blocked", "image {} not in {}".format(_image, _flash), _age=age)
+    if lines is None:
+        return plan_entry(_host, "change_loader", "boot system unknown", _age=boot_age)
+    if [" ".join(line.split()) for line in lines] == target:
+        return plan_entry(_host, "none", "boot system already set", _age=boot_age)
+    return plan_entry(_host, "change_loader", "boot system is {}".format(lines or "empty"), _age=boot_age)
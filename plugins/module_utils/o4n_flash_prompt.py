@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Lectura por patron (read_mode: pattern).
+#
+# En vez de escalar todas las esperas con global_delay_factor, cada comando espera un patron de fin (o de error)
+# seguido del prompt, con un timeout propio. Los comandos rapidos (dir, show, config) retornan apenas aparece el prompt;
+# solo verify, write memory, archive tar, la copia SCP y el copy pull del dispositivo reciben timeouts largos.
+
+import re
+
+
+# Global variables
+READ_MODES = ["delay", "pattern"]
+CMD_TIMEOUTS = {
+    "dir": 30.0,
+    "show": 30.0,
+    "config": 30.0,
+    "save": 120.0,
+    "verify": 900.0,
+    "scp": 120.0,
+    "copy": 3600.0,
+    "archive": 900.0,
+}
+CMD_PATTERNS = {
+    "dir": r"(bytes free\)|%\s*Error|Invalid input)[\s\S]*{prompt}",
+    "verify": r"(=\s*[0-9a-fA-F]{32,}|%\s*Error|Invalid input)[\s\S]*{prompt}",
+    "save": r"(\[OK\]|%\s*Error|Invalid input)[\s\S]*{prompt}",
+}
+
+
+# Timeout de un tipo de comando, con override del playbook
+def cmd_timeout(_kind, _timeouts=None):
+    timeouts = dict(CMD_TIMEOUTS)
+    timeouts.update({key: float(value) for key, value in (_timeouts or {}).items()})
+    return timeouts.get(_kind, CMD_TIMEOUTS["dir"])
+
+
+# Patron de fin de un comando: fin o error + prompt
+def cmd_pattern(_device, _kind):
+    prompt = re.escape(getattr(_device, "base_prompt", "") or "") + r"[^\n]*[>#]"
+    pattern = CMD_PATTERNS.get(_kind)
+    return pattern.replace("{prompt}", prompt) if pattern else prompt
+
+
+# Envia un comando exec
+def send_cmd(_device, _cmd, _kind, _mode="delay", _timeouts=None):
+    if _mode != "pattern":
+        return _device.send_command(_cmd)
+    return _device.send_command(_cmd, expect_string=cmd_pattern(_device, _kind),
+                                read_timeout=cmd_timeout(_kind, _timeouts))
+
+
+# Envia comandos de configuracion
+def send_config(_device, _cmds, _mode="delay", _timeouts=None):
+    if _mode != "pattern":
+        return _device.send_config_set(_cmds)
+    return _device.send_config_set(_cmds, read_timeout=cmd_timeout("config", _timeouts))
+
+
+# Graba la configuracion
+def save_running(_device, _mode="delay", _timeouts=None):
+    if _mode != "pattern":
+        return _device.save_config()
+    return send_cmd(_device, "write memory", "save", _mode, _timeouts)
+
+
+# Ajusta un FileTransfer de netmiko al modo por patron. El verify del hash lo monta attach_hashes (o4n_flash_hash)
+def tune_transfer(_scp_transfer, _device, _mode="delay", _timeouts=None):
+    if _mode != "pattern":
+        return _scp_transfer
+    _scp_transfer.socket_timeout = cmd_timeout("scp", _timeouts)
+    return _scp_transfer
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Pre-check de alcanzabilidad antes de SSH (precheck: true).
+#
+# Antes de connectToDevice se abre un socket TCP al destino SSH del dispositivo con un timeout corto y se espera
+# el banner SSH (un middlebox puede aceptar el TCP sin que haya un sshd detras). El destino se resuelve con el
+# ssh_config (HostName / Port). Un dispositivo detras de ProxyJump o ProxyCommand no se prueba: probar el bastion
+# no dice nada del dispositivo y cada fork sumaria una conexion contra su MaxStartups.
+#
+# precheck_hosts permite probar en paralelo toda la lista de hosts del play en la primera ejecucion. Un solo fork
+# prueba cada host: bajo el lock de reach.json marca los hosts que va a probar (pid y hasta cuando) y los demas
+# forks esperan ese resultado en vez de volver a probar. Los resultados quedan en reach.json por precheck_ttl
+# segundos. Un host inalcanzable falla de inmediato con su motivo.
+
+import math
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import (
+    state_path, read_json, locked_json
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_sched import pid_alive
+
+
+# Global variables
+REACH_FILE = "reach.json"
+REACH_TIMEOUT = 2.0
+REACH_TTL = 60
+REACH_WORKERS = 64
+REACH_GRACE = 1.0
+REACH_POLL = .1
+
+
+# Destino TCP (host, port) del SSH hacia el dispositivo, o None si no se puede probar
+def ssh_target(_host, _sshconf="no"):
+    if _sshconf in ["no", "", None]:
+        return _host, 22
+    config = paramiko.SSHConfig.from_path(os.path.expanduser(_sshconf))
+    source = config.lookup(_host)
+    if "proxycommand" in source or "proxyjump" in source:
+        return None
+    return source.get("hostname", _host), int(source.get("port", 22))
+
+
+# Conecta por TCP y lee el banner SSH. Retorna (ok, motivo)
+def probe(_target, _timeout=REACH_TIMEOUT):
+    if _target is None:
+        return True, "not probed"
+    try:
+        sock = socket.create_connection(_target, timeout=_timeout)
+        try:
+            banner = sock.recv(256)
+        finally:
+            sock.close()
+        if not banner.startswith(b"SSH-"):
+            return False, "tcp/{} {} no SSH banner".format(_target[1], _target[0])
+        return True, "reachable"
+    except socket.timeout:
+        return False, "tcp/{} {} timeout after {}s".format(_target[1], _target[0], _timeout)
+    except socket.gaierror as error:
+        return False, "{} name resolution failed: {}".format(_target[0], error)
+    except OSError as error:
+        return False, "tcp/{} {} {}".format(_target[1], _target[0], error.strerror or error)
+
+
+# Resultado vigente de un host en reach.json, o None
+def fresh_entry(_reach, _host, _ttl, _now):
+    entry = _reach.get(str(_host), {})
+    return entry if "ok" in entry and _now - entry["time"] <= _ttl else None
+
+
+# Prueba en curso por otro fork que sigue vivo
+def probing(_entry, _now):
+    return bool(_entry.get("probing")) and _entry["probing"] != os.getpid() and pid_alive(_entry["probing"]) \
+        and _now <= _entry["until"]
+
+
+# Marca como propios los hosts sin resultado vigente ni prueba en curso. Retorna los hosts marcados
+def claim_hosts(_hosts, _ttl=REACH_TTL, _timeout=REACH_TIMEOUT):
+    now = time.time()
+    with locked_json(state_path(REACH_FILE)) as reach:
+        claimed = [str(host) for host in dict.fromkeys(_hosts) if fresh_entry(reach, host, _ttl, now) is None and
+                   not probing(reach.get(str(host), {}), now)]
+        # connect y banner pueden tardar _timeout cada uno, en tandas de REACH_WORKERS
+        until = now + 2 * _timeout * math.ceil(len(claimed) / float(REACH_WORKERS)) + REACH_GRACE
+        for host in claimed:
+            reach[host] = dict(reach.get(host, {}), probing=os.getpid(), until=until)
+    return claimed
+
+
+# Prueba en paralelo una lista de hosts y guarda el resultado
+def probe_hosts(_hosts, _sshconf="no", _timeout=REACH_TIMEOUT):
+    hosts = list(dict.fromkeys(_hosts))
+    with ThreadPoolExecutor(max_workers=max(1, min(REACH_WORKERS, len(hosts)))) as pool:
+        results = dict(zip(hosts, pool.map(lambda host: probe(ssh_target(host, _sshconf), _timeout), hosts)))
+    now = time.time()
+    with locked_json(state_path(REACH_FILE)) as reach:
+        for host, (ok, reason) in results.items():
+            reach[str(host)] = {"ok": ok, "reason": reason, "time": now}
+        for host in [key for key, value in reach.items() if now - value.get("time", value.get("until", 0)) > 3600]:
+            del reach[host]
+    return results
+
+
+# Pre-check de un host. Retorna (ok, ret_msg)
+def precheck(_host, _sshconf="no", _hosts=None, _timeout=REACH_TIMEOUT, _ttl=REACH_TTL):
+    entry = fresh_entry(read_json(state_path(REACH_FILE)), _host, _ttl, time.time())
+    if entry:
+        return entry["ok"], "precheck failed (cached): {}".format(entry["reason"]) if not entry["ok"] else ""
+    claimed = claim_hosts([_host] + list(_hosts or []), _ttl, _timeout)
+    if claimed:
+        results = probe_hosts(claimed, _sshconf, _timeout)
+        if str(_host) in results:
+            ok, reason = results[str(_host)]
+            return ok, "precheck failed: {}".format(reason) if not ok else ""
+    # otro fork esta probando este host: espera su resultado
+    while True:
+        reach = read_json(state_path(REACH_FILE))
+        now = time.time()
+        entry = fresh_entry(reach, _host, _ttl, now)
+        if entry:
+            return entry["ok"], "precheck failed: {}".format(entry["reason"]) if not entry["ok"] else ""
+        if not probing(reach.get(str(_host), {}), now):
+            break
+        time.sleep(REACH_POLL)
+    ok, reason = probe_hosts([_host], _sshconf, _timeout)[_host]
+    return ok, "precheck failed: {}".format(reason) if not ok else ""
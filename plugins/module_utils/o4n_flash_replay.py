@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Record & replay de sesiones netmiko.
+#
+# Grabacion: exportar O4N_FLASH_RECORD=<directorio> antes de correr el playbook. Cada sesion se guarda como
+# <directorio>/<host>@<timestamp>-<pid>.json con la secuencia exacta de llamadas y respuestas. Los passwords del
+# modulo, las credenciales de URL y las lineas password/secret se enmascaran como en el log (o4n_flash_log).
+# Replay: ReplayConnection(fixture, label) sirve la transcripcion a velocidad maxima o con el timing grabado.
+
+import json
+import os
+import time
+from datetime import datetime
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_log import secret_list, redact_data
+
+
+# Global variables
+RECORD_ENV = "O4N_FLASH_RECORD"
+FIXTURE_VERSION = 1
+RECORDED_METHODS = {
+    "device": ["send_command", "send_command_timing", "send_command_expect", "_send_command_str",
+               "send_config_set", "save_config", "enable", "find_prompt", "write_channel", "read_channel",
+               "read_until_prompt", "read_until_pattern", "disconnect"],
+    "transfer": ["verify_space_available", "check_file_exists", "compare_md5", "remote_md5", "remote_file_size",
+                 "transfer_file", "get_file", "put_file", "establish_scp_conn", "close_scp_chan"],
+}
+RECORDED_ATTRS = ["device_type", "host", "base_prompt", "global_delay_factor", "RETURN"]
+
+
+# Serializa resultados a JSON
+def to_json(_value):
+    if _value is None or isinstance(_value, (bool, int, float, str)):
+        return _value
+    if isinstance(_value, (list, tuple)):
+        return [to_json(item) for item in _value]
+    if isinstance(_value, dict):
+        return {str(key): to_json(item) for key, item in _value.items()}
+    return repr(_value)
+
+
+# Transcripcion de una sesion
+class SessionRecorder(object):
+    def __init__(self, _host, _path, _secrets=None):
+        self.host = _host
+        self.path = _path
+        self.secrets = secret_list(_secrets)
+        self.start = time.time()
+        self.calls = []
+        self.attrs = {}
+
+    def save(self):
+        fixture = {
+            "version": FIXTURE_VERSION,
+            "host": self.host,
+            "recorded": datetime.utcfromtimestamp(self.start).isoformat() + "Z",
+            "attrs": redact_data(self.attrs, self.secrets),
+            "calls": redact_data(self.calls, self.secrets),
+        }
+        with open(self.path, "w") as fixture_fd:
+            json.dump(fixture, fixture_fd, indent=1)
+
+
+# Proxy que graba las llamadas a un objeto netmiko
+class RecordingProxy(object):
+    def __init__(self, _target, _recorder, _label):
+        self.__dict__["_target"] = _target
+        self.__dict__["_recorder"] = _recorder
+        self.__dict__["_label"] = _label
+        _recorder.attrs.setdefault(_label, {
+            attr: to_json(getattr(_target, attr)) for attr in RECORDED_ATTRS if hasattr(_target, attr)
+        })
+
+    def __getattr__(self, _name):
+        value = getattr(self._target, _name)
+        if _name not in RECORDED_METHODS.get(self._label, []) or not callable(value):
+            return value
+
+        def recorded(*args, **kwargs):
+            recorder = self._recorder
+            entry = {"label": self._label, "method": _name, "args": to_json(args), "kwargs": to_json(kwargs),
+                     "offset": round(time.time() - recorder.start, 6)}
+            start = time.time()
+            try:
+                result = value(*args, **kwargs)
+                entry["result"] = to_json(result)
+                return result
+            except Exception as error:
+                entry["error"] = {"type": type(error).__name__, "message": str(error)}
+                raise
+            finally:
+                entry["elapsed"] = round(time.time() - start, 6)
+                recorder.calls.append(entry)
+                if _name == "disconnect":
+                    recorder.save()
+        return recorded
+
+    def __setattr__(self, _name, _value):
+        setattr(self._target, _name, _value)
+
+
+# Envuelve la conexion si el modo grabacion esta activo. _secrets se enmascaran en el fixture
+def record_session(_device, _host, _secrets=None):
+    record_dir = os.environ.get(RECORD_ENV)
+    if not record_dir or _device is None:
+        return _device
+    record_dir = os.path.expanduser(record_dir)
+    if not os.path.isdir(record_dir):
+        os.makedirs(record_dir)
+    fixture = os.path.join(record_dir, "{}@{}-{}.json".format(
+        str(_host).replace("/", "_"), datetime.utcnow().strftime("%Y%m%dT%H%M%S"), os.getpid()))
+    return RecordingProxy(_device, SessionRecorder(_host, fixture, _secrets), "device")
+
+
+# Envuelve un objeto asociado a una sesion grabada (ej. FileTransfer)
+def record_object(_device, _target, _label):
+    if isinstance(_device, RecordingProxy):
+        return RecordingProxy(_target, _device._recorder, _label)
+    return _target
+
+
+# Error de replay: la secuencia de llamadas no coincide con la transcripcion
+class ReplayMismatch(Exception):
+    pass
+
+
+# Carga un fixture grabado
+def load_fixture(_path):
+    with open(_path) as fixture_fd:
+        fixture = json.load(fixture_fd)
+    if fixture.get("version") != FIXTURE_VERSION:
+        raise ReplayMismatch("Unsupported fixture version {}".format(fixture.get("version")))
+    return fixture
+
+
+# Conexion que sirve una transcripcion grabada
+class ReplayConnection(object):
+    def __init__(self, _fixture, _label="device", _timing=False, _methods=None):
+        fixture = load_fixture(_fixture) if isinstance(_fixture, str) else _fixture
+        self._label = _label
+        self._timing = _timing
+        self._calls = [call for call in fixture["calls"] if call["label"] == _label and
+                       (_methods is None or call["method"] in _methods)]
+        self._position = 0
+        for attr, value in fixture.get("attrs", {}).get(_label, {}).items():
+            setattr(self, attr, value)
+
+    def __getattr__(self, _name):
+        if _name.startswith("__"):
+            raise AttributeError(_name)
+
+        def replayed(*args, **kwargs):
+            if self._position >= len(self._calls):
+                raise ReplayMismatch("Unexpected call {}(): transcript exhausted".format(_name))
+            call = self._calls[self._position]
+            if call["method"] != _name:
+                raise ReplayMismatch("Unexpected call {}(), transcript expects {}()".format(_name, call["method"]))
+            self._position += 1
+            if self._timing:
+                time.sleep(call.get("elapsed", 0))
+            if "error" in call:
+                raise replay_error(call["error"])
+            return call.get("result")
+        return replayed
+
+    # Llamadas de la transcripcion no consumidas
+    def pending(self):
+        return len(self._calls) - self._position
+
+    def rewind(self):
+        self._position = 0
+
+
+# Reconstruye la excepcion grabada
+def replay_error(_error):
+    builtin = {"ConnectionError": ConnectionError, "TypeError": TypeError, "ValueError": ValueError,
+               "IOError": IOError, "OSError": OSError, "EOFError": EOFError}
+    return builtin.get(_error["type"], Exception)(_error["message"])
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Cache local de los scans de flash y del boot system de cada dispositivo.
+#
+# o4n_flash_dir y o4n_flash_chgldr guardan el listado parseado por outputFlash en scan/<host>.json, por
+# file system, con la fecha del scan y sin los directorios. o4n_flash_chgldr guarda ademas las lineas boot system
+# que configura; o4n_flash_dir con scan_boot y el cleanup de o4n_flash_copy guardan las que leen y la imagen que
+# esta corriendo. El modo plan de los modulos evalua contra este cache.
+#
+# Con scan_ttl, o4n_flash_dir y o4n_flash_chgldr leen el listado del cache si no es mas viejo que scan_ttl en vez
+# de ejecutar dir. o4n_flash_copy mantiene el cache al dia: un put exitoso agrega el file al listado (patch_scan)
+# y un put fallido, que puede dejar un file parcial, descarta el listado (drop_scan). Cada host tiene su file y
+# se actualiza bajo flock (o4n_flash_state), asi los forks concurrentes no pisan sus cambios.
+
+import os
+import time
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import (
+    state_path, read_json, locked_json
+)
+
+
+# Global variables
+SCAN_DIR = "scan"
+
+
+# Path del cache de un host
+def scan_path(_host):
+    return state_path(SCAN_DIR, "{}.json".format(str(_host).replace(os.sep, "_")))
+
+
+# Key de un file system (flash:, flash:/, flash0: ...)
+def flash_key(_flash):
+    return str(_flash).strip().rstrip("/")
+
+
+# Entero de un campo del listado, 0 si no es numerico
+def to_int(_value):
+    try:
+        return int(str(_value).strip())
+    except (TypeError, ValueError):
+        return 0
+
+
+# Guarda el listado parseado por outputFlash sin los _directories. Un listado sin bytes free (error del dir) no se
+# guarda
+def store_scan(_host, _salida_json, _directories=None):
+    if "Bytes_free" not in _salida_json:
+        return
+    files = {}
+    for entry in _salida_json.get("Files", []):
+        for name, size in entry.items():
+            if name.strip() not in (_directories or []):
+                files[name.strip()] = to_int(size)
+    with locked_json(scan_path(_host)) as scan:
+        scan.setdefault("flash", {})[flash_key(_salida_json.get("Flash", ""))] = {
+            "time": time.time(), "files": files, "bytes_free": to_int(_salida_json.get("Bytes_free")),
+            "capacity": to_int(_salida_json.get("Flash_capacity")), "directory": _salida_json.get("Directorio", ""),
+        }
+
+
+# Guarda las lineas boot system del dispositivo y, si se leyo, la imagen que esta corriendo
+def store_boot(_host, _lines, _running=None):
+    with locked_json(scan_path(_host)) as scan:
+        scan["boot"] = {"time": time.time(), "lines": [line.strip() for line in _lines if line.strip()]}
+        if _running is not None:
+            scan["running"] = {"time": time.time(), "image": _running}
+
+
+# Scan de un file system si no es mas viejo que _max_age. Retorna (entry, age) o (None, age)
+def load_scan(_host, _flash, _max_age):
+    entry = read_json(scan_path(_host)).get("flash", {}).get(flash_key(_flash))
+    if not entry:
+        return None, None
+    age = time.time() - entry["time"]
+    return (entry if age <= _max_age else None), round(age, 1)
+
+
+# Lineas boot system si no son mas viejas que _max_age. Retorna (lines, age) o (None, age)
+def load_boot(_host, _max_age):
+    entry = read_json(scan_path(_host)).get("boot")
+    if not entry:
+        return None, None
+    age = time.time() - entry["time"]
+    return (entry["lines"] if age <= _max_age else None), round(age, 1)
+
+
+# Imagen que esta corriendo si no es mas vieja que _max_age. Retorna (image, age) o (None, age)
+def load_running(_host, _max_age):
+    entry = read_json(scan_path(_host)).get("running")
+    if not entry:
+        return None, None
+    age = time.time() - entry["time"]
+    return (entry["image"] if age <= _max_age else None), round(age, 1)
+
+
+# Agrega o reemplaza files ({file: bytes}) y quita files del listado en cache, ajustando bytes free. La fecha del
+# scan no cambia: el listado patcheado vence igual que el scan original
+def patch_scan(_host, _flash, _files=None, _removed=None):
+    with locked_json(scan_path(_host)) as scan:
+        entry = scan.get("flash", {}).get(flash_key(_flash))
+        if not entry:
+            return
+        for name in _removed or []:
+            entry["bytes_free"] += entry["files"].pop(name, 0)
+        for name, size in (_files or {}).items():
+            entry["bytes_free"] -= size - entry["files"].get(name, 0)
+            entry["files"][name] = size
+        entry["bytes_free"] = max(entry["bytes_free"], 0)
+
+
+# Descarta el listado de un file system, o todos los del host si _flash es None
+def drop_scan(_host, _flash=None):
+    with locked_json(scan_path(_host)) as scan:
+        if _flash is None:
+            scan.pop("flash", None)
+        else:
+            scan.get("flash", {}).pop(flash_key(_flash), None)
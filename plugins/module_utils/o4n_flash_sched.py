@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Scheduler de transferencias a nivel controller.
+#
+# Todos los forks de o4n_flash_copy comparten una cola (sched/queue.json bajo flock). Antes de abrir el canal SCP
+# cada transferencia toma un ticket y espera a ser admitida segun:
+#   - max_transfers: transferencias simultaneas en todo el controller
+#   - site_max_transfers: transferencias simultaneas por sitio (grupo de inventario)
+#   - fair queuing: entre los tickets elegibles se admite primero el del sitio con menos transferencias activas y,
+#     a igualdad, el mas antiguo
+# max_bps limita el throughput total del controller: cada transferencia activa recibe max_bps / activas y se
+# frena desde el callback de progreso de SCP.
+
+import os
+import time
+import uuid
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import (
+    state_path, read_json, locked_json
+)
+
+
+# Global variables
+QUEUE_FILE = os.path.join("sched", "queue.json")
+QUEUE_POLL = .5
+SHARE_REFRESH = 1.0
+
+
+# Proceso vivo
+def pid_alive(_pid):
+    try:
+        os.kill(_pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+# Transferencias activas: total y por sitio
+def active_counts(_tickets):
+    total = 0
+    sites = {}
+    for ticket in _tickets.values():
+        if ticket.get("admitted"):
+            total += 1
+            sites[ticket["site"]] = sites.get(ticket["site"], 0) + 1
+    return total, sites
+
+
+# Elige el proximo ticket a admitir
+def next_ticket(_tickets, _max_transfers, _site_max):
+    total, sites = active_counts(_tickets)
+    if _max_transfers and total >= _max_transfers:
+        return None
+    waiting = [(sites.get(ticket["site"], 0), ticket["enqueued"], ticket_id)
+               for ticket_id, ticket in _tickets.items() if not ticket.get("admitted") and
+               not (_site_max and sites.get(ticket["site"], 0) >= _site_max)]
+    return min(waiting)[2] if waiting else None
+
+
+# Ticket de una transferencia
+class TransferTicket(object):
+    def __init__(self, _site, _size, _max_bps=0):
+        self.id = uuid.uuid4().hex
+        self.site = _site
+        self.size = _size
+        self.max_bps = _max_bps
+        self.enqueued = time.time()
+        self.admitted = None
+        self.share = _max_bps
+        self.share_checked = 0
+        self.window_start = None
+        self.window_sent = 0
+
+    def queue_wait(self):
+        return round((self.admitted or time.time()) - self.enqueued, 3)
+
+    # Throughput asignado: max_bps repartido entre las transferencias activas
+    def refresh_share(self):
+        now = time.time()
+        if now - self.share_checked >= SHARE_REFRESH:
+            total = active_counts(read_json(state_path(QUEUE_FILE)).get("tickets", {}))[0]
+            self.share = float(self.max_bps) / max(1, total)
+            self.share_checked = now
+        return self.share
+
+    # Callback de progreso SCP (filename, size, sent): frena la transferencia para respetar su parte de max_bps
+    def progress(self, _filename, _size, _sent):
+        if not self.max_bps:
+            return
+        now = time.time()
+        if self.window_start is None or _sent < self.window_sent:
+            self.window_start, self.window_sent = now, _sent
+            return
+        allowed = (now - self.window_start) * self.refresh_share()
+        ahead = (_sent - self.window_sent) - allowed
+        if ahead > 0:
+            time.sleep(ahead / self.share)
+
+
+# Espera turno en la cola del controller. Retorna (ticket, ret_msg, success)
+def join_queue(_site, _size, _max_transfers=0, _site_max=0, _max_bps=0, _timeout=3600):
+    ticket = TransferTicket(_site, _size, _max_bps)
+    deadline = ticket.enqueued + _timeout
+    entry = {"pid": os.getpid(), "site": _site, "bytes": _size, "enqueued": ticket.enqueued, "admitted": None}
+    while True:
+        with locked_json(state_path(QUEUE_FILE)) as queue:
+            tickets = queue.setdefault("tickets", {})
+            tickets.setdefault(ticket.id, entry)
+            for ticket_id in [key for key, value in tickets.items() if not pid_alive(value["pid"])]:
+                del tickets[ticket_id]
+            if next_ticket(tickets, _max_transfers, _site_max) == ticket.id:
+                ticket.admitted = time.time()
+                tickets[ticket.id]["admitted"] = ticket.admitted
+                return ticket, "Transfer admitted", True
+            if time.time() >= deadline:
+                tickets.pop(ticket.id, None)
+                return ticket, "Transfer queue timeout after {}s".format(_timeout), False
+        time.sleep(QUEUE_POLL)
+
+
+# Libera el turno
+def leave_queue(_ticket):
+    if _ticket is None:
+        return
+    with locked_json(state_path(QUEUE_FILE)) as queue:
+        queue.setdefault("tickets", {}).pop(_ticket.id, None)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Estado local del controller compartido entre ejecuciones y forks concurrentes de los modulos.
+#
+# Los files viven en O4N_FLASH_STATE_DIR (default ~/.cache/o4n_flash). Cada file JSON se actualiza bajo un
+# flock exclusivo y se reescribe de forma atomica (tmp + rename), de modo que los lectores sin lock nunca ven
+# un file a medio escribir.
+
+import errno
+import fcntl
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+# Global variables
+STATE_ENV = "O4N_FLASH_STATE_DIR"
+STATE_DEFAULT = "~/.cache/o4n_flash"
+
+
+# Path dentro del directorio de estado (crea los directorios intermedios)
+def state_path(*_parts):
+    base = os.path.expanduser(os.environ.get(STATE_ENV, STATE_DEFAULT))
+    path = os.path.join(base, *_parts)
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+    return path
+
+
+# Lee un file JSON sin lock
+def read_json(_path, _default=None):
+    try:
+        with open(_path) as json_fd:
+            return json.load(json_fd)
+    except (IOError, OSError, ValueError):
+        return {} if _default is None else _default
+
+
+# Escribe un file JSON de forma atomica
+def write_json(_path, _data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(_path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as json_fd:
+            json.dump(_data, json_fd)
+        os.rename(tmp, _path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+# Lock exclusivo entre procesos
+@contextmanager
+def file_lock(_path):
+    with open(_path + ".lock", "a") as lock_fd:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            yield lock_fd
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+
+# Read-modify-write de un file JSON bajo lock
+@contextmanager
+def locked_json(_path, _default=None):
+    with file_lock(_path):
+        data = read_json(_path, _default)
+        yield data
+        write_json(_path, data)
+
+
+# Semaforo entre procesos: toma uno de _slots locks libres. Retorna el fd tomado o None si vence _timeout
+def acquire_slot(_path, _slots, _timeout=600.0, _poll=.25):
+    deadline = time.time() + _timeout
+    while True:
+        for index in range(max(1, int(_slots))):
+            lock_fd = open("{}.slot-{}.lock".format(_path, index), "a")
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_fd
+            except (IOError, OSError):
+                lock_fd.close()
+        if time.time() >= deadline:
+            return None
+        time.sleep(_poll)
+
+
+# Libera un slot tomado con acquire_slot
+def release_slot(_lock_fd):
+    if _lock_fd is not None and not _lock_fd.closed:
+        fcntl.flock(_lock_fd, fcntl.LOCK_UN)
+        _lock_fd.close()
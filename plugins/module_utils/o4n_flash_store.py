@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Store deduplicado por contenido para operation: get (store_path).
+#
+# El file recibido se hashea (sha256) mientras llega y se escribe una sola vez en <store>/blobs/<aa>/<sha256>.
+# d_path/d_file queda como hardlink al blob (symlink si el store esta en otro file system) y cada get agrega
+# una referencia (host, source, path, sha256, fecha) a <store>/manifest.jsonl. Los files chicos se reciben en
+# memoria: si el blob ya existe no se escribe nada en disco.
+
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import file_lock
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_transport import receive_into
+
+
+# Global variables
+STORE_MEMORY = 32 * 1024 * 1024
+MANIFEST_FILE = "manifest.jsonl"
+
+
+# Path del blob de un digest
+def blob_path(_store, _digest):
+    return os.path.join(_store, "blobs", _digest[:2], _digest)
+
+
+# Crea un directorio si no existe
+def make_dirs(_path):
+    if not os.path.isdir(_path):
+        os.makedirs(_path, exist_ok=True)
+    return _path
+
+
+# File object que hashea lo que recibe. Guarda en memoria hasta STORE_MEMORY y despues en un tmp del store
+class BlobWriter(object):
+    def __init__(self, _store, _memory=STORE_MEMORY):
+        self.store = _store
+        self.memory = _memory
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.buffer = bytearray()
+        self.spill = None
+        self.spill_path = None
+
+    def write(self, _data):
+        self.hash.update(_data)
+        self.size += len(_data)
+        if self.spill is None and self.size > self.memory:
+            fd, self.spill_path = tempfile.mkstemp(dir=make_dirs(os.path.join(self.store, "tmp")))
+            self.spill = os.fdopen(fd, "wb")
+            self.spill.write(self.buffer)
+            self.buffer = bytearray()
+        if self.spill is not None:
+            self.spill.write(_data)
+        else:
+            self.buffer.extend(_data)
+        return len(_data)
+
+    def discard(self):
+        if self.spill is not None:
+            self.spill.close()
+            os.unlink(self.spill_path)
+            self.spill = None
+
+    # Escribe el blob si es nuevo. Retorna (digest, blob, new)
+    def commit(self):
+        digest = self.hash.hexdigest()
+        blob = blob_path(self.store, digest)
+        make_dirs(os.path.dirname(blob))
+        with file_lock(blob):
+            if os.path.exists(blob):
+                self.discard()
+                return digest, blob, False
+            if self.spill is None:
+                fd, self.spill_path = tempfile.mkstemp(dir=make_dirs(os.path.join(self.store, "tmp")))
+                with os.fdopen(fd, "wb") as blob_fd:
+                    blob_fd.write(self.buffer)
+            else:
+                self.spill.close()
+                self.spill = None
+            os.chmod(self.spill_path, 0o444)
+            os.rename(self.spill_path, blob)
+        return digest, blob, True
+
+
+# Deja _path apuntando al blob (hardlink, o symlink entre file systems)
+def link_blob(_blob, _path):
+    tmp = "{}.o4n-{}".format(_path, os.getpid())
+    try:
+        os.link(_blob, tmp)
+    except OSError:
+        os.symlink(os.path.abspath(_blob), tmp)
+    os.rename(tmp, _path)
+
+
+# Agrega una referencia al manifest del store
+def record_ref(_store, _entry):
+    manifest = os.path.join(_store, MANIFEST_FILE)
+    with file_lock(manifest):
+        with open(manifest, "a") as manifest_fd:
+            manifest_fd.write(json.dumps(_entry, sort_keys=True) + "\n")
+
+
+# Un get sin store no debe escribir sobre un blob compartido: se desvincula el destino antes de recibir
+def guard_dest(_scp_transfer):
+    get_file = _scp_transfer.get_file
+
+    def get_unlinked():
+        dest = _scp_transfer.dest_file
+        if os.path.islink(dest) or (os.path.isfile(dest) and os.stat(dest).st_nlink > 1):
+            os.unlink(dest)
+        get_file()
+    _scp_transfer.get_file = get_unlinked
+    if _scp_transfer.direction == "get":
+        _scp_transfer.transfer_file = get_unlinked
+    return _scp_transfer
+
+
+# Redirige el get del FileTransfer al store. El resultado queda en _scp_transfer.store_ref
+def attach_store(_scp_transfer, _store, _host):
+    store = make_dirs(os.path.abspath(os.path.expanduser(_store)))
+    _scp_transfer.store_ref = None
+
+    def get_to_store():
+        writer = BlobWriter(store)
+        try:
+            receive_into(_scp_transfer, writer)
+        except Exception:
+            writer.discard()
+            raise
+        digest, blob, new = writer.commit()
+        dest = os.path.abspath(_scp_transfer.dest_file)
+        link_blob(blob, dest)
+        entry = {"host": str(_host), "source": "{}/{}".format(_scp_transfer.file_system, _scp_transfer.source_file),
+                 "path": dest, "sha256": digest, "size": writer.size, "new_blob": new,
+                 "time": datetime.now().isoformat(timespec="seconds")}
+        record_ref(store, entry)
+        _scp_transfer.store_ref = {"sha256": digest, "size": writer.size, "blob": blob, "new_blob": new}
+    _scp_transfer.get_file = get_to_store
+    _scp_transfer.transfer_file = get_to_store
+    return _scp_transfer
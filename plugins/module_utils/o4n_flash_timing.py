@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# delay_factor: auto.
+#
+# Mide el RTT de la sesion (newline -> prompt) y la latencia de un comando corto durante connectToDevice, deriva
+# el global_delay_factor de ese dispositivo y lo persiste por host, de modo que la proxima ejecucion arranca
+# con el valor aprendido y los sitios rapidos no pagan la penalidad de los lentos.
+#
+# o4n_flash_copy guarda ademas el throughput medido de cada transferencia (rate, EWMA) que usa el modo plan.
+
+import time
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import (
+    state_path, read_json, locked_json
+)
+
+
+# Global variables
+TIMING_FILE = "timing.json"
+DELAY_INITIAL = 1.0
+DELAY_MIN = .1
+DELAY_MAX = 10.0
+# netmiko escala esperas base de ~100ms con el delay factor; se busca cubrir 2x la latencia medida
+DELAY_PER_SECOND = 20.0
+RTT_SAMPLES = 3
+EWMA_ALPHA = .3
+
+
+# Interpreta el parametro delay_factor del modulo
+def parse_delay_factor(_value, _read_mode="delay"):
+    if _read_mode != "delay":
+        return 1.0
+    if str(_value).strip().lower() == "auto":
+        return "auto"
+    return float(_value)
+
+
+# Delay factor derivado de los tiempos medidos
+def derive_delay_factor(_rtt, _cmd_latency):
+    delay = max(_rtt, _cmd_latency) * DELAY_PER_SECOND
+    return round(min(DELAY_MAX, max(DELAY_MIN, delay)), 2)
+
+
+# Delay factor aprendido para un host, o el inicial si no hay historia
+def cached_delay_factor(_host):
+    entry = read_json(state_path(TIMING_FILE)).get(str(_host))
+    return entry.get("delay_factor", DELAY_INITIAL) if entry else DELAY_INITIAL
+
+
+# Mide RTT de sesion y latencia de comando sobre una conexion establecida. Se lee directo del canal hasta el
+# prompt para que la medicion no dependa del delay factor vigente
+def measure_timing(_device, _samples=RTT_SAMPLES):
+    rtts = []
+    for _ in range(_samples):
+        start = time.time()
+        _device.write_channel(_device.RETURN)
+        _device.read_until_prompt(read_timeout=30)
+        rtts.append(time.time() - start)
+    start = time.time()
+    _device.write_channel("show clock" + _device.RETURN)
+    _device.read_until_prompt(read_timeout=30)
+    cmd_latency = time.time() - start
+    return sorted(rtts)[len(rtts) // 2], cmd_latency
+
+
+# Actualiza el cache de timing del host (EWMA sobre las mediciones)
+def store_timing(_host, _rtt, _cmd_latency):
+    with locked_json(state_path(TIMING_FILE)) as timing:
+        entry = timing.get(str(_host))
+        if entry and "rtt" in entry:
+            rtt = EWMA_ALPHA * _rtt + (1 - EWMA_ALPHA) * entry["rtt"]
+            cmd_latency = EWMA_ALPHA * _cmd_latency + (1 - EWMA_ALPHA) * entry["cmd_latency"]
+        else:
+            rtt, cmd_latency = _rtt, _cmd_latency
+        entry = dict(entry or {}, rtt=round(rtt, 4), cmd_latency=round(cmd_latency, 4),
+                     delay_factor=derive_delay_factor(rtt, cmd_latency),
+                     samples=(entry or {}).get("samples", 0) + 1, updated=int(time.time()))
+        timing[str(_host)] = entry
+    return entry
+
+
+# Mide, persiste y aplica el delay factor sobre la conexion. Si la medicion falla se conserva el actual
+def tune_delay_factor(_device, _host):
+    try:
+        rtt, cmd_latency = measure_timing(_device)
+    except Exception:
+        return None
+    entry = store_timing(_host, rtt, cmd_latency)
+    _device.global_delay_factor = entry["delay_factor"]
+    return entry
+
+
+# Actualiza el throughput de transferencia medido para el host (EWMA)
+def store_rate(_host, _bytes, _seconds):
+    if _bytes <= 0 or _seconds <= 0:
+        return None
+    with locked_json(state_path(TIMING_FILE)) as timing:
+        entry = timing.setdefault(str(_host), {})
+        rate = _bytes / _seconds
+        if entry.get("rate"):
+            rate = EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * entry["rate"]
+        entry["rate"] = round(rate, 1)
+    return entry["rate"]
+
+
+# Throughput aprendido para un host, o _default si no hay historia
+def cached_rate(_host, _default=0):
+    return read_json(state_path(TIMING_FILE)).get(str(_host), {}).get("rate") or _default
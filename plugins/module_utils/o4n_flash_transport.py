@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Transporte de transferencia seleccionable para o4n_flash_copy (xfer_mode).
+#
+#   - scp: FileTransfer de netmiko. window_size / block_size ajustan la ventana y el tamano de paquete del canal
+#     SSH y el buffer del cliente SCP.
+#   - sftp: SFTP con escrituras pipelined y lecturas con prefetch, ventana y bloque configurables. En paths de
+#     alta latencia no espera el ack de cada bloque. La sesion SFTP se abre al mover los bytes y se cierra al
+#     terminar, asi no queda abierta si tranfer_logic decide no transferir.
+#   - pull: el dispositivo ejecuta "copy <pull_url>/<s_file> <f_system>/<d_file>" desde un file server. Con
+#     pull_serve y una URL http el modulo sirve solo ese file durante la copia, en la direccion de pull_url y en un
+#     puerto efimero con un path aleatorio, asi los forks concurrentes no compiten por el puerto. La distribucion
+#     peer pasa el path del file en el dispositivo fuente (pull_path) en lugar de s_file.
+#
+# Los tres se montan sobre el objeto FileTransfer, de modo que tranfer_logic no cambia: verify_space_available,
+# check_file_exists y compare_md5 siguen siendo los de netmiko y solo cambia como se mueven los bytes.
+
+import binascii
+import functools
+import os
+import re
+import shutil
+import threading
+
+try:
+    from urllib.parse import urlparse, quote
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from urlparse import urlparse
+    from urllib import quote
+    ThreadingHTTPServer = None
+    BaseHTTPRequestHandler = object
+
+import paramiko
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_prompt import cmd_timeout
+
+
+# Global variables
+XFER_MODES = ["scp", "sftp", "pull"]
+SFTP_BLOCK = 32768
+COPY_PROMPT = r"(\?\s*$|\[confirm\]\s*$|\[yes/no\]:?\s*$|{prompt})"
+COPY_ERROR = r"%\s*Error|Invalid input|[Ff]ailed|[Tt]imed out|[Rr]efused"
+
+
+# Ventana y paquete SSH de los canales que se abran sobre el transport
+def tune_ssh_transport(_transport, _window=0, _packet=0):
+    if _window:
+        _transport.default_window_size = int(_window)
+    if _packet:
+        _transport.default_max_packet_size = int(_packet)
+    return _transport
+
+
+# Transferencia SFTP pipelined
+class SftpTransfer(object):
+    def __init__(self, _scp_transfer, _window=0, _block=0):
+        self.ft = _scp_transfer
+        self.window = _window
+        self.block = int(_block or 0) or SFTP_BLOCK
+        self.client = None
+        self.sftp = None
+
+    def remote_path(self, _name):
+        return "{}/{}".format(self.ft.file_system, _name)
+
+    def open(self):
+        device = self.ft.ssh_ctl_chan
+        self.client = device._build_ssh_client()
+        self.client.connect(**device._connect_params_dict())
+        transport = tune_ssh_transport(self.client.get_transport(), self.window, self.block)
+        self.sftp = paramiko.SFTPClient.from_transport(transport, window_size=self.window or None,
+                                                       max_packet_size=self.block if self.window else None)
+
+    def close(self):
+        if self.sftp:
+            self.sftp.close()
+        if self.client:
+            self.client.close()
+        self.sftp = self.client = None
+
+    def notify(self, _sent):
+        if self.ft.progress:
+            self.ft.progress(os.path.basename(self.ft.source_file), self.ft.file_size, _sent)
+
+    def put(self):
+        if self.sftp is None:
+            self.open()
+        sent = 0
+        try:
+            with open(self.ft.source_file, "rb") as local_fd:
+                with self.sftp.open(self.remote_path(self.ft.dest_file), "wb", bufsize=self.block) as remote_fd:
+                    remote_fd.set_pipelined(True)
+                    for chunk in iter(functools.partial(local_fd.read, self.block), b""):
+                        remote_fd.write(chunk)
+                        sent += len(chunk)
+                        self.notify(sent)
+        finally:
+            self.close()
+
+    def get(self, _local_fd=None):
+        if self.sftp is None:
+            self.open()
+        received = 0
+        try:
+            with self.sftp.open(self.remote_path(self.ft.source_file), "rb", bufsize=self.block) as remote_fd:
+                remote_fd.prefetch(self.ft.file_size)
+                local_fd = _local_fd or open(self.ft.dest_file, "wb")
+                try:
+                    for chunk in iter(functools.partial(remote_fd.read, self.block), b""):
+                        local_fd.write(chunk)
+                        received += len(chunk)
+                        self.notify(received)
+                finally:
+                    if _local_fd is None:
+                        local_fd.close()
+        finally:
+            self.close()
+
+    def transfer(self):
+        if self.ft.direction == "put":
+            self.put()
+        else:
+            self.get()
+
+
+# Servidor HTTP local para pull_serve: sirve un unico file en /<token>/<file>, en _address y un puerto efimero
+class LocalFileServer(object):
+    def __init__(self, _path, _address):
+        if ThreadingHTTPServer is None:
+            raise ValueError("pull_serve requires python 3.7+")
+        self.url_path = "/{}/{}".format(binascii.hexlify(os.urandom(12)).decode("ascii"),
+                                        quote(os.path.basename(_path)))
+        handler = type(str("FileHandler"), (SingleFileHandler,), {"file_path": _path, "url_path": self.url_path})
+        self.server = ThreadingHTTPServer((_address, 0), handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    # URL del file para el dispositivo
+    def url(self, _host):
+        return "http://{}:{}{}".format(_host, self.port, self.url_path)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SingleFileHandler(BaseHTTPRequestHandler):
+    file_path = None
+    url_path = None
+
+    def send_file(self, _body):
+        if self.path != self.url_path:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(os.path.getsize(self.file_path)))
+        self.end_headers()
+        if _body:
+            with open(self.file_path, "rb") as local_fd:
+                shutil.copyfileobj(local_fd, self.wfile, SFTP_BLOCK)
+
+    def do_GET(self):
+        self.send_file(True)
+
+    def do_HEAD(self):
+        self.send_file(False)
+
+    def log_message(self, *_args):
+        pass
+
+
+# Ejecuta un copy en el dispositivo respondiendo sus preguntas con el default. Retorna la salida
+def device_copy(_device, _source, _dest, _timeouts=None):
+    prompt = re.escape(_device.base_prompt) + r"[^\n]*#\s*$"
+    pattern = COPY_PROMPT.replace("{prompt}", prompt)
+    _device.write_channel("copy {} {}{}".format(_source, _dest, _device.RETURN))
+    output = ""
+    while True:
+        chunk = _device.read_until_pattern(pattern=pattern, read_timeout=cmd_timeout("copy", _timeouts))
+        output += chunk
+        if re.search(prompt, chunk):
+            break
+        if re.search(r"\[yes/no\]:?\s*$", chunk):
+            _device.write_channel("yes" + _device.RETURN)
+        else:
+            _device.write_channel(_device.RETURN)
+    if re.search(COPY_ERROR, output) or "bytes copied" not in output:
+        raise IOError("device copy failed: {}".format(" ".join(output.split())[-200:]))
+    return output
+
+
+# Transferencia pull: el dispositivo trae el file desde pull_url
+class PullTransfer(object):
+    def __init__(self, _scp_transfer, _pull_url, _serve=False, _timeouts=None, _pull_path=None):
+        self.ft = _scp_transfer
+        self.url = _pull_url.rstrip("/")
+        self.serve = _serve
+        self.timeouts = _timeouts
+        self.path = _pull_path
+
+    def transfer(self):
+        if self.ft.direction != "put":
+            raise ValueError("xfer_mode pull only supports put operations")
+        source = "{}/{}".format(self.url, (self.path or os.path.basename(self.ft.source_file)).lstrip("/"))
+        dest = "{}/{}".format(self.ft.file_system, self.ft.dest_file)
+        parsed = urlparse(self.url)
+        if self.serve and parsed.scheme == "http":
+            with LocalFileServer(os.path.abspath(self.ft.source_file), parsed.hostname) as server:
+                device_copy(self.ft.ssh_ctl_chan, server.url(parsed.hostname), dest, self.timeouts)
+        else:
+            device_copy(self.ft.ssh_ctl_chan, source, dest, self.timeouts)
+        if self.ft.progress:
+            self.ft.progress(os.path.basename(self.ft.source_file), self.ft.file_size, self.ft.file_size)
+
+
+# Lado cliente de "scp -f": recibe un file en _fd
+def scp_receive(_channel, _fd, _progress=None, _name=""):
+    _channel.sendall(b"\x00")
+    header = b""
+    while not header.endswith(b"\n"):
+        data = _channel.recv(1)
+        if not data:
+            raise IOError("scp channel closed")
+        header += data
+    if not header.startswith(b"C"):
+        raise IOError("scp error: {}".format(header[1:].decode("utf-8", "replace").strip()))
+    size = int(header.split(b" ", 2)[1])
+    _channel.sendall(b"\x00")
+    received = 0
+    while received < size:
+        data = _channel.recv(min(SFTP_BLOCK, size - received))
+        if not data:
+            raise IOError("scp channel closed after {} of {} bytes".format(received, size))
+        _fd.write(data)
+        received += len(data)
+        if _progress:
+            _progress(_name, size, received)
+    status = _channel.recv(1)
+    if status != b"\x00":
+        raise IOError("scp error: {}".format(_channel.recv(512).decode("utf-8", "replace").strip()))
+    _channel.sendall(b"\x00")
+    return size
+
+
+# Recibe el file remoto (get) en un file object en vez de escribir dest_file, con el transporte elegido
+def receive_file(_scp_transfer, _fd):
+    engine = getattr(_scp_transfer, "engine", None)
+    if isinstance(engine, SftpTransfer):
+        engine.get(_fd)
+        return
+    remote = "{}/{}".format(_scp_transfer.file_system, _scp_transfer.source_file)
+    client = _scp_transfer.scp_conn.scp_client
+    channel = client.transport.open_session()
+    try:
+        channel.settimeout(client.socket_timeout)
+        channel.exec_command(b"scp -f " + client.sanitize(remote.encode("utf-8")))
+        scp_receive(channel, _fd, _scp_transfer.progress, os.path.basename(remote))
+    finally:
+        channel.close()
+        _scp_transfer.scp_conn.close()
+
+
+# Recibe el get en _fd. Una capa montada sobre el FileTransfer (compression) puede reemplazar la recepcion
+def receive_into(_scp_transfer, _fd):
+    receiver = getattr(_scp_transfer, "receiver", None)
+    if receiver:
+        receiver(_fd)
+    else:
+        receive_file(_scp_transfer, _fd)
+
+
+# Monta el transporte elegido sobre un FileTransfer de netmiko
+def select_transport(_scp_transfer, _xfer=None):
+    xfer = _xfer or {}
+    mode = xfer.get("mode", "scp")
+    if mode == "scp":
+        if xfer.get("window_size") or xfer.get("block_size"):
+            establish = _scp_transfer.establish_scp_conn
+
+            def establish_tuned():
+                establish()
+                tune_ssh_transport(_scp_transfer.scp_conn.scp_conn.get_transport(), xfer.get("window_size"),
+                                   xfer.get("block_size"))
+                if xfer.get("block_size"):
+                    _scp_transfer.scp_conn.scp_client.buff_size = int(xfer["block_size"])
+            _scp_transfer.establish_scp_conn = establish_tuned
+        return _scp_transfer
+
+    if mode == "sftp":
+        engine = SftpTransfer(_scp_transfer, xfer.get("window_size"), xfer.get("block_size"))
+        # put y get abren la sesion y la cierran al terminar
+        _scp_transfer.establish_scp_conn = lambda: None
+        _scp_transfer.close_scp_chan = engine.close
+    elif mode == "pull":
+        if not xfer.get("pull_url"):
+            raise ValueError("xfer_mode pull requires pull_url")
+        engine = PullTransfer(_scp_transfer, xfer["pull_url"], xfer.get("pull_serve"), xfer.get("timeouts"),
+                              xfer.get("pull_path"))
+        _scp_transfer.establish_scp_conn = lambda: None
+        _scp_transfer.close_scp_chan = lambda: None
+    else:
+        raise ValueError("Unsupported xfer_mode {}".format(mode))
+    _scp_transfer.engine = engine
+    _scp_transfer.transfer_file = engine.transfer
+    _scp_transfer.put_file = engine.transfer
+    _scp_transfer.get_file = engine.transfer
+    return _scp_transfer
@@ -50,12 +50,86 @@ options:
             - name_ldr: nombre de la imagen
             - clean: se borran todos los registro tipo 'boot system flash'
         requerido: True
+    delay_factor:
+        description:
+            - Factor de delay aplicabe a la session SSH que se establece con los dispositivos
+        values:
+            - valor decimal comenzando en .1
+            - auto: mide RTT y latencia de comandos al conectar y deriva el factor por dispositivo. El valor aprendido se guarda por host en ~/.cache/o4n_flash/timing.json (O4N_FLASH_STATE_DIR)
+        requerido: False
+        default: .1
     ssh_config:
         description:
             - configuracio SSH que usará netmiko
         values:
             - nombre del file incluido el path, que contiene la configuracion SSH
         requerido: False
+    bastion_mode:
+        description:
+            - transporte hacia dispositivos detras de un bastion (ProxyJump en ssh_config)
+        values:
+            - direct: una conexion nueva al bastion por dispositivo
+            - mux: una unica conexion autenticada al bastion por controller (OpenSSH ControlMaster), compartida por todos los forks, con un canal por dispositivo. Usa ssh con BatchMode=yes: requiere autenticacion por clave al bastion
+        requerido: False
+        default: direct
+    mux_channels:
+        description:
+            - cantidad maxima de canales simultaneos sobre la conexion al bastion (alinear con MaxSessions del bastion)
+        requerido: False
+        default: 10
+    mux_persist:
+        description:
+            - segundos que la conexion al bastion permanece abierta sin uso
+        requerido: False
+        default: 600
+    precheck:
+        description:
+            - prueba TCP (puerto SSH, resuelto con ssh_config; no se prueba si hay ProxyJump o ProxyCommand) con un timeout corto antes de conectar. Un dispositivo inalcanzable falla de inmediato con el motivo "precheck failed"
+        requerido: False
+        default: False
+    precheck_hosts:
+        description:
+            - lista de hosts del play a probar en paralelo junto con este. Los resultados se guardan por precheck_ttl segundos en ~/.cache/o4n_flash/reach.json (O4N_FLASH_STATE_DIR). Cada host lo prueba un solo fork; los demas esperan su resultado sin volver a probar
+        requerido: False
+    precheck_timeout:
+        description:
+            - timeout en segundos de la prueba TCP
+        requerido: False
+        default: 2
+    precheck_ttl:
+        description:
+            - segundos de validez de un resultado del pre-check
+        requerido: False
+        default: 60
+    read_mode:
+        description:
+            - modo de espera de las respuestas del dispositivo
+        values:
+            - delay: todas las lecturas se escalan con delay_factor
+            - pattern: cada comando espera su prompt o patron de fin con un timeout propio. delay_factor se ignora
+        requerido: False
+        default: delay
+    timeouts:
+        description:
+            - timeouts en segundos por tipo de comando para read_mode pattern
+        values:
+            - dict con claves dir, config, save
+        requerido: False
+    scan_ttl:
+        description:
+            - segundos de validez del listado guardado. Si el ultimo scan de la flash (o4n_flash_dir, o4n_flash_chgldr, o4n_flash_copy) no es mas viejo que scan_ttl y tiene la imagen, no se ejecuta dir para verificarla. Si la imagen no esta en el listado guardado se escanea igual. 0 escanea siempre
+        requerido: False
+        default: 0
+    plan:
+        description:
+            - no se conecta al dispositivo. Evalua contra el ultimo scan de flash y boot system guardados (o4n_flash_dir, o4n_flash_chgldr) si la imagen esta en la flash y si el boot system ya esta configurado. Retorna plan con action none, change_loader, blocked (imagen no esta en la flash) o scan (no hay scan o es mas viejo que plan_max_age)
+        requerido: False
+        default: False
+    plan_max_age:
+        description:
+            - segundos de validez de un scan guardado para el modo plan
+        requerido: False
+        default: 3600
 """
 
 EXAMPLES = """
@@ -92,6 +166,30 @@ tasks:
       plataforma: "{{var_data_model_dev.plataforma}}"
       chg_loader: False
     register: salida
+
+  - name: Oction Flash Chg_ldr. Plan, sin conectarse
+    o4n_flash_chgldr:
+      host_address: "{{ansible_host}}"
+      user: "{{ansible_user}}"
+      password: "{{ansible_password}}"
+      enable_password: "{{ansible_become_password}}"
+      plataforma: "{{var_data_model_dev.plataforma}}"
+      flash_device: "{{global.container}}"
+      chg_loader: image_name
+      plan: True
+    register: salida
+
+  - name: Oction Flash Chg_ldr. Usa el listado guardado si tiene menos de 5 minutos
+    o4n_flash_chgldr:
+      host_address: "{{ansible_host}}"
+      user: "{{ansible_user}}"
+      password: "{{ansible_password}}"
+      enable_password: "{{ansible_become_password}}"
+      plataforma: "{{var_data_model_dev.plataforma}}"
+      flash_device: "{{global.container}}"
+      chg_loader: image_name
+      scan_ttl: 300
+    register: salida
 """
 
 RETURN = """
@@ -116,11 +214,43 @@ case2:
             "loader": "Boot register cleaned",
             }
         }
+
+case3:
+    description: Modo plan. Ejemplo, la imagen no esta en la flash segun el ultimo scan
+    "salida": {
+        "changed": false,
+        "failed": false,
+        "msg": "plan: blocked",
+        "plan": {
+            "action": "blocked",
+            "bytes": 0,
+            "duration_s": 0,
+            "host": "10.20.1.11",
+            "needs_connection": true,
+            "reason": "image c2900-universalk9-mz.SPA.155-3.M2.bin not in flash:",
+            "scan_age_s": 95.2
+            }
+        }
 """
 
 # Modulos
 import netmiko
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_replay import record_session
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_prompt import (
+    READ_MODES, send_cmd, send_config, save_running
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_timing import (
+    parse_delay_factor, cached_delay_factor, tune_delay_factor
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_reach import precheck
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_scan import (
+    store_scan, store_boot, load_scan
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_plan import plan_entry, plan_loader
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_bastion import (
+    BASTION_MODES, bastion_mux, release_mux
+)
 import json
 from collections import OrderedDict
 
@@ -128,8 +258,18 @@ from collections import OrderedDict
 # Global variables
 
 # Connect to device
-def connectToDevice(_dev_type, _ip, _user, _passw, _shhconf, _enable="", _delayf=.1):
+def connectToDevice(_dev_type, _ip, _user, _passw, _shhconf, _enable="", _delayf=.1, _mux=None,
+                    _precheck=None):
     try:
+        if _precheck:
+            reachable, ret_msg = precheck(_ip, _shhconf, _precheck["hosts"], _precheck["timeout"], _precheck["ttl"])
+            if not reachable:
+                return None, ret_msg, False
+        if _mux and _shhconf != "no":
+            _shhconf = bastion_mux(_shhconf, _ip, _mux["channels"], _mux["persist"])
+        auto_delay = _delayf == "auto"
+        if auto_delay:
+            _delayf = cached_delay_factor(_ip)
         if _shhconf != "no":
             fromDevice = netmiko.ConnectHandler(
                 device_type=_dev_type,
@@ -149,8 +289,11 @@ def connectToDevice(_dev_type, _ip, _user, _passw, _shhconf, _enable="", _delayf
                 secret=_enable,
                 global_delay_factor=_delayf,
             )
+        fromDevice = record_session(fromDevice, _ip, [_passw, _enable])
         if _enable:
             fromDevice.enable()
+        if auto_delay:
+            tune_delay_factor(fromDevice, _ip)
         success = True
         ret_msg = "Successful connection"
     except Exception as error:
@@ -162,9 +305,9 @@ def connectToDevice(_dev_type, _ip, _user, _passw, _shhconf, _enable="", _delayf
 
 
 # Send config command
-def config_command(_device, _cmd):
+def config_command(_device, _cmd, _mode="delay", _timeouts=None):
     try:
-        _device.send_config_set(_cmd)
+        send_config(_device, _cmd, _mode, _timeouts)
         success = True
         ret_msg = "Command executed"
     except Exception as error:
@@ -174,8 +317,8 @@ def config_command(_device, _cmd):
 
 
 # Save configuration
-def save_config(_device):
-    _device.save_config()
+def save_config(_device, _mode="delay", _timeouts=None):
+    save_running(_device, _mode, _timeouts)
 
 
 # String to Bool
@@ -184,13 +327,14 @@ def str2bool(_v):
 
 
 # Flash content
-def outputFlash(_device, _cmd, _ip, _file_to_search, _flash="flash0:"):
+def outputFlash(_device, _cmd, _ip, _file_to_search, _flash="flash0:", _mode="delay", _timeouts=None):
     salida_json = OrderedDict()
     lista_flash_final = []
     lista_files = []
+    directorios = []
     ret_msg = ""
     try:
-        output = _device.send_command(_cmd + " " + _flash)
+        output = send_cmd(_device, _cmd + " " + _flash, "dir", _mode, _timeouts)
         salida = output.splitlines()
         lista_flash_final = list(filter(None, salida))
         salida_json["Device"] = _ip
@@ -211,9 +355,12 @@ def outputFlash(_device, _cmd, _ip, _file_to_search, _flash="flash0:"):
                 linea_file = elem.split(" ")
                 str_list = list(filter(None, linea_file))
                 lista_files.append({str_list[8]: str_list[2]})
+                if str_list[1].startswith("d"):
+                    directorios.append(str_list[8])
             else:
                 salida_json["unknown"] = elem.strip()
         salida_json["Files"] = lista_files
+        salida_json["Directories"] = directorios
 
         # Search file
         search_file = {"searching": _file_to_search}
@@ -262,7 +409,7 @@ def boot_system_exists(_device, _cmd, _line_content):
 
 
 # Change boot system command
-def chgLoader(_device, _image, _plataforma, _cmd):
+def chgLoader(_device, _image, _plataforma, _cmd, _mode="delay", _timeouts=None):
     output = {"loader": "Platform " + _plataforma + " is not supported"}
     success = False
     cmds = []
@@ -276,10 +423,10 @@ def chgLoader(_device, _image, _plataforma, _cmd):
                 ]
 
                 # Change boot system command
-                success_l = config_command(_device, cmds)
+                success_l = config_command(_device, cmds, _mode, _timeouts)
                 if success_l:
                     output["loader"] = _cmd + _image
-                    save_config(_device)
+                    save_config(_device, _mode, _timeouts)
                     ret_msg = "Boot loader changed"
                     success = True
                 else:
@@ -288,10 +435,10 @@ def chgLoader(_device, _image, _plataforma, _cmd):
             else:
                 ret_msg = "IOS {} is not supported".format(_plataforma)
         elif _image == 'clean':
-            success_l = config_command(_device, "no boot system")
+            success_l = config_command(_device, "no boot system", _mode, _timeouts)
             if success_l:
                 output["loader"] = "no boot system"
-                save_config(_device)
+                save_config(_device, _mode, _timeouts)
                 success = True
                 ret_msg = "Boot loader register cleaned"
         else:
@@ -318,6 +465,18 @@ def main():
             chg_loader=dict(requiered=True),
             delay_factor=dict(requiered=False, type='str', default=".1"),
             ssh_config=dict(requiered=False, type='str', default="no"),
+            read_mode=dict(requiered=False, type='str', choices=READ_MODES, default="delay"),
+            timeouts=dict(requiered=False, type='dict', default={}),
+            bastion_mode=dict(requiered=False, type='str', choices=BASTION_MODES, default="direct"),
+            mux_channels=dict(requiered=False, type='int', default=10),
+            mux_persist=dict(requiered=False, type='int', default=600),
+            precheck=dict(requiered=False, type='bool', default=False),
+            precheck_hosts=dict(requiered=False, type='list', elements='str', default=[]),
+            precheck_timeout=dict(requiered=False, type='float', default=2),
+            precheck_ttl=dict(requiered=False, type='int', default=60),
+            scan_ttl=dict(requiered=False, type='int', default=0),
+            plan=dict(requiered=False, type='bool', default=False),
+            plan_max_age=dict(requiered=False, type='int', default=3600),
         )
     )
 
@@ -332,29 +491,53 @@ def main():
     user = module.params.get("user")
     password = module.params.get("password")
     enable_password = module.params.get("enable_password")
-    delay_f = float(module.params.get("delay_factor"))
+    read_mode = module.params.get("read_mode")
+    timeouts = module.params.get("timeouts")
+    mux = {"channels": module.params.get("mux_channels"), "persist": module.params.get("mux_persist")} \
+        if module.params.get("bastion_mode") == "mux" else None
+    reach = {"hosts": module.params.get("precheck_hosts"), "timeout": module.params.get("precheck_timeout"),
+             "ttl": module.params.get("precheck_ttl")} if module.params.get("precheck") else None
+    delay_f = parse_delay_factor(module.params.get("delay_factor"), read_mode)
     shhconf = module.params.get("ssh_config")
 
+    # Modo plan: no se conecta
+    if module.params.get("plan"):
+        if image in ['no']:
+            plan = plan_entry(host_address, "none", "no change requirement")
+        else:
+            plan = plan_loader(host_address, flash_device, image, boot_cmd, module.params.get("plan_max_age"))
+        module.exit_json(msg="plan: {}".format(plan["action"]), plan=plan)
+
     # Establece conexión ssh con el dispisitivo
     output = {}
     success = True
     if image not in ['no']:
         device, ret_msg, success_conn = connectToDevice(
-            plataforma, host_address, user, password, shhconf, enable_password, delay_f
+            plataforma, host_address, user, password, shhconf, enable_password, delay_f, mux, reach
         )
         if success_conn:
             if image not in ['clean']:
-                # verifica image exist on flash
-                salida_json, ret_msg, success = outputFlash(device, "dir", host_address, image, flash_device)
-                if str2bool(str(salida_json["Search"]["found"])):
+                # verifica image exist on flash: listado guardado si no vencio scan_ttl y tiene la imagen
+                entry = load_scan(host_address, flash_device, module.params.get("scan_ttl"))[0] \
+                    if module.params.get("scan_ttl") > 0 else None
+                if entry and image.strip() in entry["files"]:
+                    found = True
+                else:
+                    salida_json, ret_msg, success = outputFlash(device, "dir", host_address, image, flash_device,
+                                                                read_mode, timeouts)
+                    store_scan(host_address, salida_json, salida_json.get("Directories"))
+                    found = str2bool(str(salida_json["Search"]["found"]))
+                if found:
                     # Cambia boot loader
-                    ret_msg, success, output = chgLoader(device, image, plataforma, boot_cmd)
+                    ret_msg, success, output = chgLoader(device, image, plataforma, boot_cmd, read_mode, timeouts)
                 else:
                     ret_msg = "Boot loader change has failed, image does not exist"
                     success = False
             else:
                 # Clean boot loader
-                ret_msg, success, output = chgLoader(device, image, plataforma, boot_cmd)
+                ret_msg, success, output = chgLoader(device, image, plataforma, boot_cmd, read_mode, timeouts)
+            if success:
+                store_boot(host_address, [output["loader"]] if image not in ['clean'] else [])
         else:
             success = False
     else:
@@ -365,6 +548,7 @@ def main():
     # Dsconección
     if success_conn:
         device.disconnect()
+    release_mux()
 
     # Retorna valores al playbook
     if success:
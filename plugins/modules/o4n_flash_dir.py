@@ -50,12 +50,91 @@ options:
             - False: nothing to search
             - file_name: nombre del file a buscar
         requerido: False
+    delay_factor:
+        description:
+            Factor de delay aplicabe a la session SSH que se establece con los dispositivos
+        values:
+            - valor decimal comenzando en .1
+            - auto: mide RTT y latencia de comandos al conectar y deriva el factor por dispositivo. El valor aprendido se guarda por host en ~/.cache/o4n_flash/timing.json (O4N_FLASH_STATE_DIR)
+        requerido: False
+        default: .1
     ssh_config:
         description:
             configuracio SSH que usará netmiko
         values:
             - nombre del file incluido el path, que contiene la configuracion SSH
         requerido: False
+    bastion_mode:
+        description:
+            transporte hacia dispositivos detras de un bastion (ProxyJump en ssh_config)
+        values:
+            - direct: una conexion nueva al bastion por dispositivo
+            - mux: una unica conexion autenticada al bastion por controller (OpenSSH ControlMaster), compartida por todos los forks, con un canal por dispositivo. Usa ssh con BatchMode=yes: requiere autenticacion por clave al bastion
+        requerido: False
+        default: direct
+    mux_channels:
+        description:
+            cantidad maxima de canales simultaneos sobre la conexion al bastion (alinear con MaxSessions del bastion)
+        requerido: False
+        default: 10
+    mux_persist:
+        description:
+            segundos que la conexion al bastion permanece abierta sin uso
+        requerido: False
+        default: 600
+    precheck:
+        description:
+            prueba TCP (puerto SSH, resuelto con ssh_config; no se prueba si hay ProxyJump o ProxyCommand) con un timeout corto antes de conectar. Un dispositivo inalcanzable falla de inmediato con el motivo "precheck failed"
+        requerido: False
+        default: False
+    precheck_hosts:
+        description:
+            lista de hosts del play a probar en paralelo junto con este. Los resultados se guardan por precheck_ttl segundos en ~/.cache/o4n_flash/reach.json (O4N_FLASH_STATE_DIR). Cada host lo prueba un solo fork; los demas esperan su resultado sin volver a probar
+        requerido: False
+    precheck_timeout:
+        description:
+            timeout en segundos de la prueba TCP
+        requerido: False
+        default: 2
+    precheck_ttl:
+        description:
+            segundos de validez de un resultado del pre-check
+        requerido: False
+        default: 60
+    read_mode:
+        description:
+            modo de espera de las respuestas del dispositivo
+        values:
+            - delay: todas las lecturas se escalan con delay_factor
+            - pattern: cada comando espera su prompt o patron de fin con un timeout propio. delay_factor se ignora
+        requerido: False
+        default: delay
+    timeouts:
+        description:
+            timeouts en segundos por tipo de comando para read_mode pattern
+        values:
+            - dict con claves dir, show
+        requerido: False
+    scan_boot:
+        description:
+            lee ademas las lineas boot system de la running-config y la imagen que esta corriendo (show version). Se guardan con el scan para el modo plan de o4n_flash_chgldr y de o4n_flash_copy con cleanup
+        requerido: False
+        default: False
+    scan_ttl:
+        description:
+            segundos de validez del listado guardado. Si el ultimo scan de la flash (o4n_flash_dir, o4n_flash_chgldr, o4n_flash_copy) no es mas viejo que scan_ttl se retorna sin conectarse al dispositivo. Los put de o4n_flash_copy actualizan el listado guardado. 0 escanea siempre
+        requerido: False
+        default: 0
+    plan:
+        description:
+            no se conecta al dispositivo. Retorna el listado del ultimo scan guardado en ~/.cache/o4n_flash/scan (O4N_FLASH_STATE_DIR) y un plan con action none, o action scan si no hay scan o es mas viejo que plan_max_age
+        requerido: False
+        default: False
+    plan_max_age:
+        description:
+            segundos de validez de un scan guardado para el modo plan
+        requerido: False
+        default: 3600
 """
 
 EXAMPLES = """
@@ -82,6 +161,30 @@ tasks:
       flash_device: "{{device.container}}"
       search: "{{var_data_model_dev.search_file}}"
     register: salida
+
+  - name: Oction Flash Scanning. Scan previo para el modo plan (incluye boot system)
+    o4n_flash_dir:
+      host_address: "{{ansible_host}}"
+      user: "{{ansible_user}}"
+      password: "{{ansible_password}}"
+      enable_password: "{{ansible_become_password}}"
+      plataforma: "{{var_data_model_dev.plataforma}}"
+      flash_device: "{{device.container}}"
+      search: "no"
+      scan_boot: True
+    register: salida
+
+  - name: Oction Flash Scanning. Reusa el listado si tiene menos de 5 minutos
+    o4n_flash_dir:
+      host_address: "{{ansible_host}}"
+      user: "{{ansible_user}}"
+      password: "{{ansible_password}}"
+      enable_password: "{{ansible_become_password}}"
+      plataforma: "{{var_data_model_dev.plataforma}}"
+      flash_device: "{{device.container}}"
+      search: "{{var_data_model_dev.search_file}}"
+      scan_ttl: 300
+    register: salida
 """
 
 RETURN = """
@@ -102,16 +205,55 @@ case1:
             "searched": "c2900-universalk9-mz.SPA.155-3.M2.bin"
             }
         }
+case2:
+    description: Modo plan. content es el ultimo scan guardado y plan indica si hace falta escanear
+    "salida": {
+        "msg": "plan: none",
+        "content": {...},
+        "plan": {
+            "action": "none",
+            "bytes": 0,
+            "duration_s": 0,
+            "host": "10.20.1.11",
+            "needs_connection": false,
+            "reason": "cached scan is fresh",
+            "scan_age_s": 812.4
+            }
+        }
 """
 
 from netmiko import ConnectHandler
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_replay import record_session
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_prompt import READ_MODES, send_cmd
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_timing import (
+    parse_delay_factor, cached_delay_factor, tune_delay_factor
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_reach import precheck
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_scan import (
+    store_scan, store_boot, load_scan, load_boot
+)
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_plan import plan_scan
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_cleanup import running_image
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_bastion import (
+    BASTION_MODES, bastion_mux, release_mux
+)
 from collections import OrderedDict
 
 
 # Connecto to device
-def connectToDevice(_dev_type, _ip, _user, _passw, _sshconf, _enable="", _delayf=.1):
+def connectToDevice(_dev_type, _ip, _user, _passw, _sshconf, _enable="", _delayf=.1, _mux=None,
+                    _precheck=None):
     try:
+        if _precheck:
+            reachable, ret_msg = precheck(_ip, _sshconf, _precheck["hosts"], _precheck["timeout"], _precheck["ttl"])
+            if not reachable:
+                return None, ret_msg, False
+        if _mux and _sshconf != "no":
+            _sshconf = bastion_mux(_sshconf, _ip, _mux["channels"], _mux["persist"])
+        auto_delay = _delayf == "auto"
+        if auto_delay:
+            _delayf = cached_delay_factor(_ip)
         if _sshconf != "no":
             fromDevice = ConnectHandler(
                 device_type=_dev_type,
@@ -131,8 +273,11 @@ def connectToDevice(_dev_type, _ip, _user, _passw, _sshconf, _enable="", _delayf
                 secret=_enable,
                 global_delay_factor=_delayf,
             )
+        fromDevice = record_session(fromDevice, _ip, [_passw, _enable])
         if _enable:
             fromDevice.enable()
+        if auto_delay:
+            tune_delay_factor(fromDevice, _ip)
         success = True
         ret_msg = "Successful connection"
     except Exception as error:
@@ -144,11 +289,11 @@ def connectToDevice(_dev_type, _ip, _user, _passw, _sshconf, _enable="", _delayf
 
 
 # Flash content
-def outputFlash(_device, _cmd, _ip, _file_to_search, _flash="flash0:"):
+def outputFlash(_device, _cmd, _ip, _file_to_search, _flash="flash0:", _mode="delay", _timeouts=None):
     salida_json = OrderedDict()
 
     try:
-        output = _device.send_command(_cmd + " " + _flash)
+        output = send_cmd(_device, _cmd + " " + _flash, "dir", _mode, _timeouts)
     except ConnectionError as error:
         ret_msg = "{}Error de conexión: {}".format("\n", error)
 
@@ -157,6 +302,7 @@ def outputFlash(_device, _cmd, _ip, _file_to_search, _flash="flash0:"):
     salida_json["Device"] = _ip
     salida_json["Flash"] = _flash.strip()
     lista_files = []
+    directorios = []
 
     try:
         for elem in lista_flash_final:
@@ -171,9 +317,13 @@ def outputFlash(_device, _cmd, _ip, _file_to_search, _flash="flash0:"):
                 linea_file = elem.split(" ")
                 str_list = list(filter(None, linea_file))
                 lista_files.append({str_list[8]: str_list[2]})
+                if str_list[1].startswith("d"):
+                    directorios.append(str_list[8])
             else:
                 salida_json["unknown"] = elem.strip()
         salida_json["Files"] = lista_files
+        # main los quita del listado y no los guarda en el scan
+        salida_json["Directories"] = directorios
 
         # Search file
         search_file = {"searching": _file_to_search}
@@ -201,6 +351,34 @@ def outputFlash(_device, _cmd, _ip, _file_to_search, _flash="flash0:"):
     return salida_json, ret_msg, success
 
 
+# Boot system configurado
+def bootSystem(_device, _mode="delay", _timeouts=None):
+    output = send_cmd(_device, "show running-config | include ^boot system", "show", _mode, _timeouts)
+    return [line.strip() for line in output.splitlines() if line.strip().startswith("boot system")]
+
+
+# Listado de flash desde el scan guardado
+def cachedFlash(_ip, _flash, _file_to_search, _entry):
+    salida_json = OrderedDict()
+    salida_json["Device"] = _ip
+    salida_json["Flash"] = _flash.strip()
+    salida_json["Directorio"] = _entry["directory"]
+    salida_json["Flash_capacity"] = str(_entry["capacity"])
+    salida_json["Bytes_free"] = str(_entry["bytes_free"])
+    salida_json["Files"] = [{name: str(size)} for name, size in _entry["files"].items()]
+    salida_json["Search"] = {"searching": _file_to_search,
+                             "found": _file_to_search not in ['no', 'clean'] and _file_to_search.strip() in _entry["files"]}
+    return salida_json
+
+
+# Mensaje de un listado leido del cache
+def cachedMsg(_salida_json, _age):
+    if _salida_json["Search"]["searching"] in ['no', 'clean']:
+        return "scanning flash cached {}s ago and file searching skipped".format(_age)
+    return "scanning flash cached {}s ago and file {}".format(_age, "found" if _salida_json["Search"]["found"]
+                                                                   else "not found")
+
+
 # Main
 def main():
     module = AnsibleModule(
@@ -214,6 +392,19 @@ def main():
             search=dict(required=False),
             delay_factor=dict(requiered=False, type='str', default=".1"),
             ssh_config=dict(requiered=False, type='str', default="no"),
+            read_mode=dict(requiered=False, type='str', choices=READ_MODES, default="delay"),
+            timeouts=dict(requiered=False, type='dict', default={}),
+            bastion_mode=dict(requiered=False, type='str', choices=BASTION_MODES, default="direct"),
+            mux_channels=dict(requiered=False, type='int', default=10),
+            mux_persist=dict(requiered=False, type='int', default=600),
+            precheck=dict(requiered=False, type='bool', default=False),
+            precheck_hosts=dict(requiered=False, type='list', elements='str', default=[]),
+            precheck_timeout=dict(requiered=False, type='float', default=2),
+            precheck_ttl=dict(requiered=False, type='int', default=60),
+            scan_boot=dict(requiered=False, type='bool', default=False),
+            scan_ttl=dict(requiered=False, type='int', default=0),
+            plan=dict(requiered=False, type='bool', default=False),
+            plan_max_age=dict(requiered=False, type='int', default=3600),
         )
     )
 
@@ -224,19 +415,47 @@ def main():
     user = module.params.get("user")
     password = module.params.get("password")
     enable_password = module.params.get("enable_password")
-    delay_f = float(module.params.get("delay_factor"))
+    read_mode = module.params.get("read_mode")
+    timeouts = module.params.get("timeouts")
+    mux = {"channels": module.params.get("mux_channels"), "persist": module.params.get("mux_persist")} \
+        if module.params.get("bastion_mode") == "mux" else None
+    reach = {"hosts": module.params.get("precheck_hosts"), "timeout": module.params.get("precheck_timeout"),
+             "ttl": module.params.get("precheck_ttl")} if module.params.get("precheck") else None
+    delay_f = parse_delay_factor(module.params.get("delay_factor"), read_mode)
     sshconf = module.params.get('ssh_config')
 
+    # Modo plan: no se conecta
+    if module.params.get("plan"):
+        plan, entry = plan_scan(host_address, flash_device, module.params.get("plan_max_age"))
+        output = cachedFlash(host_address, flash_device, search, entry) if entry else {}
+        module.exit_json(msg="plan: {}".format(plan["action"]), content=output, plan=plan)
+
+    # Listado guardado si no vencio scan_ttl
+    if module.params.get("scan_ttl") > 0:
+        entry, age = load_scan(host_address, flash_device, module.params.get("scan_ttl"))
+        boot = load_boot(host_address, module.params.get("scan_ttl"))[0] if module.params.get("scan_boot") else []
+        if entry and boot is not None:
+            output = cachedFlash(host_address, flash_device, search, entry)
+            module.exit_json(msg=cachedMsg(output, age), content=output)
+
     # Establece conexión ssh con el dispisitivo
-    device, ret_msg, success_conn = connectToDevice(plataforma, host_address, user, password, sshconf, enable_password, delay_f)
+    device, ret_msg, success_conn = connectToDevice(plataforma, host_address, user, password, sshconf, enable_password, delay_f,
+                                                    mux, reach)
 
     # escanea contenido de la flash
     if success_conn:
-        output, ret_msg, success = outputFlash(device, "dir", host_address, search, flash_device)
+        output, ret_msg, success = outputFlash(device, "dir", host_address, search, flash_device, read_mode, timeouts)
+        directories = output.pop("Directories", [])
+        if success:
+            store_scan(host_address, output, directories)
+            if module.params.get("scan_boot"):
+                store_boot(host_address, bootSystem(device, read_mode, timeouts),
+                           running_image(send_cmd(device, "show version", "show", read_mode, timeouts)) or "")
 
     # Dsconecta con el dispositivo
     if success_conn:
         device.disconnect()
+    release_mux()
 
     # Retorna valores al playbook
     if success:
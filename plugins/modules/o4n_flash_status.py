@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+DOCUMENTATION = """
+---
+module: o4n_flash_status
+version_added: "4.0"
+author: "Ed Scrimaglia"
+short_description: Estado de transferencias o4n_flash_copy en background.
+description:
+  - Lee el estado de uno o varios jobs creados con o4n_flash_copy background True.
+  - Opcionalmente espera a que terminen.
+notes:
+  - Se ejecuta en el controller que lanzo los jobs (mismo O4N_FLASH_STATE_DIR)
+options:
+    job_id:
+        description:
+            job_id, o lista de job_id, retornado por o4n_flash_copy
+        requerido: True
+    wait:
+        description:
+            espera a que todos los jobs terminen (phase done o failed)
+        requerido: False
+        default: False
+    timeout:
+        description:
+            segundos maximos de espera con wait True
+        requerido: False
+        default: 3600
+    poll:
+        description:
+            segundos entre lecturas del estado con wait True
+        requerido: False
+        default: 2
+"""
+
+EXAMPLES = """
+tasks:
+  - name: Oction Flash status. Progreso de una transferencia
+      o4n_flash_status:
+        job_id: "{{job.job_id}}"
+      register: salida
+
+  - name: Oction Flash status. Espera todas las transferencias del play
+      o4n_flash_status:
+        job_id: "{{ jobs.results | map(attribute='job_id') | list }}"
+        wait: True
+        timeout: 7200
+      register: salida
+"""
+
+RETURN = """
+case1:
+    description: Retorna el estado de cada job. result tiene el std_out de o4n_flash_copy cuando el job termina
+    "salida": {
+        "changed": false,
+        "failed": false,
+        "msg": "1 jobs running, 0 done, 0 failed",
+        "std_out": {
+            "3f9c2a7be01d4c55": {
+                "bytes_sent": 52428800,
+                "bytes_total": 104857600,
+                "eta": 41.7,
+                "file": "c2900-universalk9-mz.SPA.155-3.M2.bin",
+                "host": "10.20.1.11",
+                "phase": "transferring",
+                "rate": 1257340.2,
+                "result": null
+                }
+            }
+        }
+"""
+
+# Modulos
+import time
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_jobs import read_job, JOB_FINAL
+
+
+# Funciones
+# Estado de todos los jobs
+def jobs_status(_job_ids):
+    status = {}
+    for job_id in _job_ids:
+        status[job_id] = read_job(job_id) or {"job_id": job_id, "phase": "unknown", "result": None}
+    return status
+
+
+# Espera a que terminen todos los jobs. Retorna (status, completo)
+def wait_jobs(_job_ids, _timeout, _poll):
+    deadline = time.time() + _timeout
+    while True:
+        status = jobs_status(_job_ids)
+        if all(job["phase"] in JOB_FINAL + ["unknown"] for job in status.values()):
+            return status, True
+        if time.time() >= deadline:
+            return status, False
+        time.sleep(_poll)
+
+
+# Main
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            job_id=dict(required=True, type='list', elements='str'),
+            wait=dict(requiered=False, type='bool', default=False),
+            timeout=dict(requiered=False, type='int', default=3600),
+            poll=dict(requiered=False, type='float', default=2),
+        )
+    )
+    job_ids = module.params.get("job_id")
+
+    if module.params.get("wait"):
+        output, complete = wait_jobs(job_ids, module.params.get("timeout"), module.params.get("poll"))
+    else:
+        output, complete = jobs_status(job_ids), True
+
+    phases = [job["phase"] for job in output.values()]
+    done = phases.count("done")
+    failed = len([phase for phase in phases if phase in ["failed", "unknown"]])
+    ret_msg = "{} jobs running, {} done, {} failed".format(len(phases) - done - failed, done, failed)
+    if not complete:
+        ret_msg = "Timeout waiting jobs: " + ret_msg
+
+    # Retorna valores al playbook
+    if complete and not (module.params.get("wait") and failed):
+        module.exit_json(msg=ret_msg, std_out=output)
+    else:
+        module.fail_json(msg=ret_msg, std_out=output)
+
+
+if __name__ == "__main__":
+    main()
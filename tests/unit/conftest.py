@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+# Fixtures de los tests unitarios de la coleccion.
+#
+# Con ansible-test los tests corren dentro de ansible_collections/octupus/o4n_flash_mgmt. Con pytest desde el
+# working tree se monta la coleccion en un ansible_collections temporal (symlink, como benchmarks/o4n_flash_bench).
+# Cada test usa su propio directorio de estado (O4N_FLASH_STATE_DIR).
+
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+
+# Global variables
+COLLECTION = "ansible_collections.octupus.o4n_flash_mgmt"
+
+
+try:
+    importlib.import_module(COLLECTION + ".plugins.module_utils.o4n_flash_state")
+except ImportError:
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    base = os.path.join(tempfile.gettempdir(), "o4n_flash_test_collections")
+    link = os.path.join(base, "ansible_collections", "octupus", "o4n_flash_mgmt")
+    if not os.path.exists(link):
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        os.symlink(root, link)
+    sys.path.insert(0, base)
+    for module_name in [m for m in sys.modules if m.startswith("ansible_collections")]:
+        del sys.modules[module_name]
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("O4N_FLASH_STATE_DIR", str(tmp_path / "state"))
+    return tmp_path / "state"
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_cleanup import (
+    boot_images, running_image, boot_confs, conf_packages, protected_files, plan_cleanup
+)
+
+
+FILES = {"running.bin": 40, "boot_next.bin": 40, "golden.bin": 40, "old1.bin": 30, "old2.bin": 20, "old3.bin": 10,
+         "vlan.dat": 1, "startup-config.bak": 2, "new.bin": 5}
+PACKAGES_CONF = """
+boot rp 0 0 rp_boot cat9k-rpboot.17.09.04a.SPA.pkg
+iso  rp 0 0 rp_base cat9k-rpbase.17.09.04a.SPA.pkg
+iso  fp 0 0 fp      cat9k-sipbase.17.09.04a.SPA.pkg
+"""
+
+
+def test_boot_and_running_image():
+    lines = ["boot system flash:boot_next.bin", "boot system flash:/imgs/running.bin", "no boot manual"]
+    assert boot_images(lines) == ["boot_next.bin", "running.bin"]
+    assert running_image('System image file is "flash:/imgs/running.bin"') == "running.bin"
+    assert running_image("no image line") is None
+
+
+def test_protected_files():
+    protect = protected_files(FILES, ["boot_next.bin"], "running.bin", ["golden*"], "new.bin")
+    assert protect == {"running.bin": "running image", "boot_next.bin": "boot image", "golden.bin": "keep pattern",
+                       "vlan.dat": "config file", "startup-config.bak": "config file",
+                       "new.bin": "destination file"}
+
+
+def test_protected_install_mode_packages():
+    files = {"packages.conf": 1, "cat9k-rpboot.17.09.04a.SPA.pkg": 50, "cat9k-rpbase.17.09.04a.SPA.pkg": 50,
+             "cat9k-rpbase.16.12.01.SPA.pkg": 50, "old.bin": 30}
+    assert boot_confs(["packages.conf"], "packages.conf") == ["packages.conf", "packages.conf"]
+    packages = conf_packages(PACKAGES_CONF)
+    assert packages == ["cat9k-rpbase.17.09.04a.SPA.pkg", "cat9k-rpboot.17.09.04a.SPA.pkg",
+                        "cat9k-sipbase.17.09.04a.SPA.pkg"]
+    protect = protected_files(files, ["packages.conf"], "packages.conf", None, None, packages)
+    assert sorted(name for name, reason in protect.items() if reason == "boot package") == packages[:2]
+    assert "cat9k-rpbase.16.12.01.SPA.pkg" not in protect
+
+
+def test_protected_all_packages_when_conf_unread():
+    files = {"packages.conf": 1, "a.pkg": 50, "b.pkg": 50, "old.bin": 30}
+    protect = protected_files(files, [], "packages.conf")
+    assert protect["a.pkg"] == protect["b.pkg"] == "boot package"
+    assert "old.bin" not in protect
+    # sin .conf de boot los .pkg no se protegen
+    assert "a.pkg" not in protected_files(files, ["old.bin"], "old.bin")
+
+
+def test_plan_cleanup_smallest_covering_file():
+    protect = protected_files(FILES, ["boot_next.bin"], "running.bin", ["golden*"], "new.bin")
+    assert plan_cleanup(FILES, 15, protect) == (["old2.bin"], 20)
+    assert plan_cleanup(FILES, 30, protect) == (["old1.bin"], 30)
+
+
+def test_plan_cleanup_several_files():
+    protect = protected_files(FILES, ["boot_next.bin"], "running.bin", ["golden*"], "new.bin")
+    assert plan_cleanup(FILES, 45, protect) == (["old1.bin", "old2.bin"], 50)
+
+
+def test_plan_cleanup_fewest_bytes_among_smallest_sets():
+    files = {"a.bin": 9, "b.bin": 6, "c.bin": 5}
+    assert plan_cleanup(files, 10, {}) == (["b.bin", "c.bin"], 11)
+    files = {"a.bin": 50, "b.bin": 40, "c.bin": 30, "d.bin": 25, "e.bin": 20, "f.bin": 1}
+    assert plan_cleanup(files, 56, {}) == (["b.bin", "e.bin"], 60)
+    assert plan_cleanup(files, 91, {}) == (["a.bin", "b.bin", "f.bin"], 91)
+
+
+def test_plan_cleanup_not_enough():
+    protect = protected_files(FILES, ["boot_next.bin"], "running.bin", ["golden*"], "new.bin")
+    assert plan_cleanup(FILES, 100, protect) == (None, 60)
+    assert plan_cleanup(FILES, 0, protect) == ([], 0)
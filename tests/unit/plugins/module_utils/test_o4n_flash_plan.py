@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+import pytest
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_scan import store_scan, store_boot
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_plan import plan_transfer
+
+
+# Scan en cache: 100 bytes free
+@pytest.fixture
+def scan():
+    store_scan("r1", {"Flash": "flash:", "Bytes_free": "100", "Flash_capacity": "1000",
+                      "Files": [{"same.bin": "50"}, {"other.bin": "70"}, {"old.bin": "300"}, {"boot.bin": "400"},
+                                {"running.bin": "500"}]})
+    store_boot("r1", ["boot system flash:boot.bin"], "running.bin")
+
+
+# Plan de un put de un file local de _size bytes como d_file _dfile
+def plan_put(_tmp_path, _dfile, _size, _dmd5=False, _cleanup=None):
+    source = _tmp_path / "source.bin"
+    source.write_bytes(b"x" * _size)
+    return plan_transfer("r1", "flash:", "put", str(source), _dfile, _dfile, "source.bin", _dmd5, 3600, 1000, _cleanup)
+
+
+def test_plan_without_scan(tmp_path):
+    plan = plan_put(tmp_path, "new.bin", 10)
+    assert plan["action"] == "scan" and plan["needs_connection"]
+
+
+def test_plan_put(tmp_path, scan):
+    assert plan_put(tmp_path, "new.bin", 10)["action"] == "transfer"
+    assert plan_put(tmp_path, "other.bin", 50)["action"] == "transfer"
+    assert plan_put(tmp_path, "same.bin", 50)["action"] == "verify"
+    plan = plan_put(tmp_path, "same.bin", 50, _dmd5=True)
+    assert plan["action"] == "none" and not plan["needs_connection"]
+    assert plan_put(tmp_path, "new.bin", 200)["action"] == "no_space"
+
+
+def test_plan_put_missing_source(tmp_path, scan):
+    plan = plan_transfer("r1", "flash:", "put", str(tmp_path / "nope.bin"), "nope.bin", "nope.bin", "nope.bin")
+    assert plan["action"] == "missing"
+
+
+def test_plan_put_cleanup(tmp_path, scan):
+    plan = plan_put(tmp_path, "new.bin", 200, _cleanup=[])
+    assert plan["action"] == "cleanup" and plan["reason"] == "delete old.bin to free 300 bytes"
+    assert plan["bytes"] == 200 and plan["duration_s"] == 0.2
+    # el boot system, la imagen corriendo y cleanup_keep se protegen
+    assert plan_put(tmp_path, "new.bin", 200, _cleanup=["old*", "other*"])["action"] == "no_space"
+
+
+def test_plan_put_cleanup_unknown_boot(tmp_path):
+    # scan de o4n_flash_dir sin scan_boot: los directorios no se guardan y el boot no se conoce
+    store_scan("r1", {"Flash": "flash:", "Bytes_free": "100", "Files": [{"old.bin": "300"}, {"imgs": "4096"}]},
+               ["imgs"])
+    plan = plan_put(tmp_path, "new.bin", 200, _cleanup=[])
+    assert plan["action"] == "scan" and "scan_boot" in plan["reason"]
+    store_boot("r1", [], "old.bin")
+    assert plan_put(tmp_path, "new.bin", 200, _cleanup=[])["action"] == "no_space"
+
+
+def test_plan_put_cleanup_counts_destination(tmp_path, scan):
+    # other.bin (70) se reemplaza: 160 bytes entran en 100 free + 70
+    assert plan_put(tmp_path, "other.bin", 160, _cleanup=[])["action"] == "transfer"
+    # mismo tamano: md5 decide, cleanup no borra nada
+    store_scan("r1", {"Flash": "flash:", "Bytes_free": "0", "Files": [{"same.bin": "50"}, {"old.bin": "300"}]})
+    assert plan_put(tmp_path, "same.bin", 50, _cleanup=[])["action"] == "verify"
+
+
+def test_plan_get(tmp_path, scan):
+    dest = tmp_path / "same.bin"
+    plan = plan_transfer("r1", "flash:", "get", "same.bin", str(dest), "same.bin", "same.bin")
+    assert plan["action"] == "transfer" and plan["bytes"] == 50
+    dest.write_bytes(b"x" * 50)
+    assert plan_transfer("r1", "flash:", "get", "same.bin", str(dest), "same.bin", "same.bin")["action"] == "verify"
+    assert plan_transfer("r1", "flash:", "get", "nope.bin", str(dest), "nope.bin", "nope.bin")["action"] == "missing"
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_state import locked_json
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_scan import (
+    scan_path, store_scan, store_boot, load_scan, load_boot, load_running, patch_scan, drop_scan
+)
+
+
+SALIDA = {"Flash": "flash:/", "Files": [{"a.bin": "100"}, {"vlan.dat": "10"}], "Bytes_free": "1000",
+          "Flash_capacity": "2000", "Directorio": "flash:/"}
+
+
+# Atrasa la fecha del scan _seconds segundos
+def age_scan(_host, _seconds):
+    with locked_json(scan_path(_host)) as scan:
+        for entry in scan.get("flash", {}).values():
+            entry["time"] -= _seconds
+        for key in ("boot", "running"):
+            if key in scan:
+                scan[key]["time"] -= _seconds
+
+
+def test_load_scan_fresh_and_expired():
+    assert load_scan("r1", "flash:", 60) == (None, None)
+    store_scan("r1", SALIDA)
+    entry, age = load_scan("r1", "flash:", 60)
+    assert entry["files"] == {"a.bin": 100, "vlan.dat": 10}
+    assert entry["bytes_free"] == 1000 and age < 60
+    age_scan("r1", 120)
+    entry, age = load_scan("r1", "flash:/", 60)
+    assert entry is None and age >= 120
+
+
+def test_store_scan_skips_directories():
+    store_scan("r1", dict(SALIDA, Files=SALIDA["Files"] + [{"imgs": "4096"}]), ["imgs"])
+    assert load_scan("r1", "flash:", 60)[0]["files"] == {"a.bin": 100, "vlan.dat": 10}
+
+
+def test_store_scan_ignores_failed_dir():
+    store_scan("r1", {"Flash": "flash:", "Files": []})
+    assert load_scan("r1", "flash:", 60) == (None, None)
+
+
+def test_load_boot_expired():
+    store_boot("r1", ["boot system flash:a.bin", " "])
+    assert load_boot("r1", 60)[0] == ["boot system flash:a.bin"]
+    assert load_running("r1", 60) == (None, None)
+    store_boot("r1", ["boot system flash:a.bin"], "a.bin")
+    assert load_running("r1", 60)[0] == "a.bin"
+    age_scan("r1", 120)
+    assert load_boot("r1", 60)[0] is None
+    assert load_running("r1", 60)[0] is None
+
+
+def test_patch_scan_adds_replaces_and_removes():
+    store_scan("r1", SALIDA)
+    age_scan("r1", 30)
+    patch_scan("r1", "flash:", {"b.bin": 200, "a.bin": 150})
+    entry, age = load_scan("r1", "flash:", 60)
+    assert entry["files"] == {"a.bin": 150, "vlan.dat": 10, "b.bin": 200}
+    assert entry["bytes_free"] == 1000 - 200 - 50
+    # el patch no renueva la fecha del scan
+    assert age >= 30
+    patch_scan("r1", "flash:", _removed=["a.bin", "missing.bin"])
+    entry, _age = load_scan("r1", "flash:", 60)
+    assert "a.bin" not in entry["files"] and entry["bytes_free"] == 900
+
+
+def test_patch_scan_without_scan():
+    patch_scan("r1", "flash:", {"b.bin": 200})
+    assert load_scan("r1", "flash:", 60) == (None, None)
+
+
+def test_drop_scan():
+    store_scan("r1", SALIDA)
+    store_scan("r1", dict(SALIDA, Flash="bootflash:"))
+    drop_scan("r1", "flash:")
+    assert load_scan("r1", "flash:", 60)[0] is None
+    assert load_scan("r1", "bootflash:", 60)[0] is not None
+    drop_scan("r1")
+    assert load_scan("r1", "bootflash:", 60)[0] is None
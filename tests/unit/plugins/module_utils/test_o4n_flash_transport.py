@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+import io
+
+from ansible_collections.octupus.o4n_flash_mgmt.plugins.module_utils.o4n_flash_transport import (
+    SftpTransfer, select_transport
+)
+
+
+# FileTransfer minimo para SftpTransfer
+class FakeTransfer(object):
+    direction = "put"
+    file_system = "flash:"
+    progress = None
+    ssh_ctl_chan = None
+
+    def __init__(self, _source_file, _dest_file):
+        self.source_file = _source_file
+        self.dest_file = _dest_file
+        self.file_size = 0
+
+    def establish_scp_conn(self):
+        raise AssertionError("scp connection opened")
+
+    def close_scp_chan(self):
+        pass
+
+
+# Cliente SFTP en memoria
+class FakeSftp(object):
+    def __init__(self):
+        self.files = {}
+        self.closed = False
+
+    def open(self, _path, _mode, bufsize=-1):
+        remote_fd = io.BytesIO()
+        remote_fd.set_pipelined = lambda _pipelined: None
+        remote_fd.close = lambda: self.files.__setitem__(_path, remote_fd.getvalue())
+        return remote_fd
+
+    def close(self):
+        self.closed = True
+
+
+def test_sftp_session_only_while_moving_bytes(tmp_path, monkeypatch):
+    sftps = []
+
+    def fake_open(_engine):
+        sftps.append(FakeSftp())
+        _engine.sftp = sftps[-1]
+    monkeypatch.setattr(SftpTransfer, "open", fake_open)
+    source = tmp_path / "a.bin"
+    source.write_bytes(b"x" * 10)
+    transfer = select_transport(FakeTransfer(str(source), "a.bin"), {"mode": "sftp"})
+    # tranfer_logic decide no transferir: no se abre ninguna sesion
+    transfer.establish_scp_conn()
+    transfer.close_scp_chan()
+    assert sftps == []
+    transfer.establish_scp_conn()
+    transfer.transfer_file()
+    assert sftps[0].files == {"flash:/a.bin": b"x" * 10}
+    assert sftps[0].closed and transfer.engine.sftp is None